@@ -1,12 +1,30 @@
-from groq import Groq
-from config import GROQ_API_KEY
-from typing import List, Tuple
+import os
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AsyncIterator, FrozenSet, List, Optional, Tuple
 
-import threading
+from appointments import SlotTaken, get_store
+from context import RequestContext
+from escalation import escalate
+from intents import INTENT_MATCHER
+from completion import completion
+from metrics import QUEUE_SECONDS, RequestTrace, registry
+from ratelimit import admission
+from scheduler import Priority, upstream_limiter
+from sessions import count_tokens
 
-# In-memory storage for last appointment (thread-safe for FastAPI dev use)
-last_appointment = {"date": None, "time": None}
-appointment_lock = threading.Lock()
+
+# Stop generating as soon as the reply is known to be replaced by a tool response
+# (override with environment variables)
+EARLY_TOOL_STOP = os.getenv("EARLY_TOOL_STOP", "1") == "1"
+
+EARLY_STOPS = registry.counter("llm_early_stops_total",
+                               "Streams cut short because a tool was going to replace the reply.", ("intent",))
+
+
+MAX_TOKENS = 350  # reply length cap; also the worst case reserved from the token budgets
 
 SYSTEM_PROMPT = """You are Dr. Mustafa Badshah, a warm and experienced clinical psychologist. 
 Respond to patients with:
@@ -23,120 +41,75 @@ Key principles:
 - Always keep the conversation going by asking open-ended questions to dive into the root cause of patients' problems
 """
 
-def query_medgemma(prompt: str) -> str:
+# Simple date and time (e.g., 12/8/2025 11:00am, 2/8/2025 11:00am, 12-8-2025 11:00, etc.)
+DATE_TIME_PATTERN = re.compile(r'(\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b)[,\s]*(\d{1,2}:\d{2}(?:\s*[ap]m)?)?', re.IGNORECASE)
+PHONE_PATTERN = re.compile(r'(\+?\d[\d\s\-]{7,}\d)')
+
+def extract_datetime(text: str) -> Tuple[Optional[str], Optional[str]]:
+    match = DATE_TIME_PATTERN.search(text)
+    if match:
+        date = match.group(1)
+        time = match.group(2) if match.group(2) else None
+        return date, time
+    return None, None
+
+@dataclass(frozen=True)
+class ToolDecision:
+    """What tool routing decided for a turn, before any reply text is produced."""
+    tool: Optional[str]
+    user_intents: FrozenSet[str]
+    response_intents: FrozenSet[str]
+    phone: Optional[str] = None
+    date: Optional[str] = None
+    time: Optional[str] = None
+    call_requested: bool = False
+
+# Intents that make detect_tool pick a tool (whose response replaces the model's text), by priority
+TOOL_INTENTS = ("distress", "medication", "appointment")
+
+@lru_cache(maxsize=1024)
+def detect_tool(user_message: str, llm_response: str = "") -> ToolDecision:
     """
-    Calls a Groq model (LLaMA3-70B) with a therapist personality profile.
-    Returns responses as an empathic mental health professional.
+    Pure tool detection: checks the user message first, then the LLM response.
+    Has no side effects, so it can be cached, profiled or run off the event loop.
     """
-    try:
-        client = Groq(api_key=GROQ_API_KEY)
-        response = client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=350,
-            temperature=0.7,
-            top_p=0.9
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return "I'm having technical difficulties, but I want you to know your feelings matter. Please try again shortly."
-
-def parse_response(stream: List[dict]) -> Tuple[str, str]:
+    user_intents = INTENT_MATCHER.intents(user_message) if user_message else frozenset()
+    response_intents = INTENT_MATCHER.intents(llm_response) if llm_response else frozenset()
+
+    def wants(intent):
+        return intent in user_intents or intent in response_intents
+
+    if wants("distress"):
+        phone_match = PHONE_PATTERN.search(user_message)
+        return ToolDecision("emergency_call", user_intents, response_intents,
+                            phone=phone_match.group(1).replace(" ", "") if phone_match else None,
+                            call_requested="call me" in user_message.lower())
+    if wants("medication"):
+        return ToolDecision("medication_advice", user_intents, response_intents)
+    if wants("appointment"):
+        date, time = extract_datetime(user_message)
+        return ToolDecision("appointment_booking", user_intents, response_intents, date=date, time=time)
+    return ToolDecision(None, user_intents, response_intents)
+
+def run_tool(decision: ToolDecision, ctx: RequestContext, final_response: str = "") -> Tuple[Optional[str], str]:
     """
-    Parse the streamed response from Groq, extracting the final response and tool called (if any).
-    For simplicity, assumes no tools are called unless distress is detected.
+    Produce the reply for a tool decision, applying its side effects (e.g. storing the appointment).
+    Returns (tool_called, response); the response is the LLM text unchanged when no tool fires.
     """
-    final_response = ""
-    tool_called_name = None
-    for chunk in stream:
-        if chunk.get("content"):
-            final_response += chunk["content"]
-
-    # Tool triggers (check both user input and LLM response, with flexible matching)
-    import re
-    def normalize(text):
-        return re.sub(r'[^a-z0-9\s]', '', text.lower())
-
-    distress_keywords = [
-        # direct crisis
-        "crisis", "emergency", "hurt myself", "kill myself", "end my life", "suicidal", "die", "cant go on", "give up", "ending my life", "no reason to live", "need help immediately", "urgent help", "im in a crisis", "i am in crisis", "need help now", "suicide",
-        # indirect/colloquial
-        "panic attack", "panic", "anxiety attack", "feel unsafe", "need to call me", "call me now", "need urgent help", "need someone to talk to urgently", "need immediate help", "help me now", "talk to me now", "need to talk now", "need support now",
-        # call-related
-        "phone call", "call me", "want to talk", "call doctor", "call therapist", "want phone call", "need phone call", "can you call me", "can i get a call"
-    ]
-    medication_keywords = [
-        "medication", "medicine", "prescribe", "antidepressant", "meds", "prescription", "take my meds", "medication advice", "medicine for depression", "medicine for anxiety",
-        # indirect/colloquial
-        "should i take pills", "should i take medicine", "do i need medication", "can you give me medicine", "can you prescribe something", "should i use antidepressants", "should i use anxiety medication"
-    ]
-    appointment_keywords = [
-        "appointment", "book", "schedule", "see a doctor", "visit a doctor", "make an appointment", "doctor appointment", "consultation", "book a session", "want appointment", "need appointment",
-        # indirect/colloquial
-        "find doctor", "find therapist", "therapist near me", "doctor near me", "want doctor like you", "need to see someone", "need to see a doctor", "can i see you", "can i book with you", "can i talk to a doctor", "can i talk to a therapist",
-        # call-related
-        "phone call", "call me", "want to talk", "call doctor", "call therapist", "want phone call", "need phone call", "can you call me", "can i get a call"
-    ]
-
-    # Accept user_message as an optional argument for direct checking
-    import inspect
-    user_message = None
-    frame = inspect.currentframe()
-    try:
-        outer_frames = inspect.getouterframes(frame)
-        for f in outer_frames:
-            if 'query' in f.frame.f_locals:
-                user_message = f.frame.f_locals['query'].message
-                break
-    except Exception:
-        user_message = None
-    finally:
-        del frame
-
-    def contains_keywords(text, keywords):
-        norm = normalize(text)
-        return any(kw in norm for kw in keywords)
-
-    def extract_datetime(text):
-        # Simple regex for date and time (e.g., 12/8/2025 11:00am, 2/8/2025 11:00am, 12-8-2025 11:00, etc.)
-        import re
-        date_time_pattern = r'(\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b)[,\s]*(\d{1,2}:\d{2}(?:\s*[ap]m)?)?'
-        match = re.search(date_time_pattern, text, re.IGNORECASE)
-        if match:
-            date = match.group(1)
-            time = match.group(2) if match.group(2) else None
-            return date, time
-        return None, None
-
-    def is_appointment_details_request(text):
-        # Check if user is asking for details/confirmation or who the appointment is with
-        keywords = ["details", "confirm", "where", "when", "info", "information", "summary", "remind", "reminder",
-                    "who is my appointment with", "to whom", "with whom", "who am i seeing", "doctor name", "therapist name", "who is my doctor", "who is my therapist"]
-        norm = normalize(text)
-        return any(kw in norm for kw in keywords)
-
-    lower_resp = final_response.lower()
-    # Check user message first, then LLM response
-    # Emergency tool: detect phone number and simulate call
-    if (user_message and contains_keywords(user_message, distress_keywords)) or contains_keywords(final_response, distress_keywords):
-        tool_called_name = "emergency_call"
-        import re
-        phone_match = re.search(r'(\+?\d[\d\s\-]{7,}\d)', user_message or "")
-        if phone_match:
-            number = phone_match.group(1).replace(" ", "")
-            final_response = f"Detected distress. Alerting emergency support at {number}. Please stay where you are—help is on the way."
-        elif user_message and ("call me" in (user_message or "").lower()):
+    tool_called_name = decision.tool
+    # Emergency tool: queue the emergency call in the background and answer right away
+    if tool_called_name == "emergency_call":
+        if ctx.can_escalate and not ctx.dry_run:
+            escalate(ctx.session_id or ctx.request_id, ctx.request_id, ctx.client_ip)
+        if decision.phone:
+            final_response = f"Detected distress. Alerting emergency support at {decision.phone}. Please stay where you are—help is on the way."
+        elif decision.call_requested:
             final_response = "Detected distress. Alerting emergency support and attempting to contact you. Please stay where you are—help is on the way."
         else:
             final_response = "Detected distress. Connecting to emergency support."
     # Medication tool: detect medicine suggestion requests
-    elif (user_message and contains_keywords(user_message, medication_keywords)) or contains_keywords(final_response, medication_keywords):
-        tool_called_name = "medication_advice"
-        med_request_keywords = ["suggest medicine", "suggest medicines", "what medicine", "what medicines", "which medicine", "which medicines", "recommend medicine", "recommend medicines", "medicine name", "medication name", "drug name", "antidepressant name", "anxiety medicine"]
-        if user_message and any(kw in (user_message or "").lower() for kw in med_request_keywords):
+    elif tool_called_name == "medication_advice":
+        if "medication_request" in decision.user_intents:
             final_response = (
                 "I'm not able to recommend or prescribe specific medications. However, common types of medications for depression and anxiety include SSRIs (like sertraline, fluoxetine), SNRIs (like venlafaxine), and others. "
                 "The right medication depends on your unique situation, medical history, and a doctor's evaluation. Please consult a licensed psychiatrist or your primary care provider to discuss what might be best for you. If you have questions about medication types, side effects, or how to talk to your doctor, let me know—I'm here to help you make informed decisions."
@@ -149,24 +122,28 @@ def parse_response(stream: List[dict]) -> Tuple[str, str]:
                 "It's important to consult a licensed psychiatrist or your primary care provider for a personalized evaluation. "
                 "If you have questions about how medication might help, possible side effects, or how to talk to your doctor about it, let me know—I'm here to help you make informed decisions."
             )
-    elif (user_message and contains_keywords(user_message, appointment_keywords)) or contains_keywords(final_response, appointment_keywords):
-        tool_called_name = "appointment_booking"
-        # Try to extract date/time from user message
-        date, time = extract_datetime(user_message or "")
+    elif tool_called_name == "appointment_booking":
         doctor_name = "Dr. Mustafa Badshah"
+        date, time = decision.date, decision.time
+        patient_id = ctx.session_id or ctx.request_id
         if date:
-            with appointment_lock:
-                last_appointment["date"] = date
-                last_appointment["time"] = time
-            if time:
-                final_response = f"Your appointment with {doctor_name} is scheduled for {date} at {time}. If you need to change it, let me know!"
+            try:
+                if ctx.dry_run:
+                    if not get_store().is_available(doctor_name, date, time):
+                        raise SlotTaken(f"{doctor_name} is already booked at {date} {time}")
+                else:
+                    get_store().book(patient_id, doctor_name, date, time)
+            except SlotTaken:
+                final_response = f"I'm sorry, {doctor_name} is already booked on {date} at {time}. Could you suggest another date or time?"
             else:
-                final_response = f"Your appointment with {doctor_name} is scheduled for {date}. If you need to add a time or change it, let me know!"
-        elif user_message and is_appointment_details_request(user_message):
-            with appointment_lock:
-                date = last_appointment["date"]
-                time = last_appointment["time"]
-            if date:
+                if time:
+                    final_response = f"Your appointment with {doctor_name} is scheduled for {date} at {time}. If you need to change it, let me know!"
+                else:
+                    final_response = f"Your appointment with {doctor_name} is scheduled for {date}. If you need to add a time or change it, let me know!"
+        elif "appointment_details" in decision.user_intents:
+            appointment = get_store().latest(patient_id)
+            if appointment:
+                date, time = appointment.date, appointment.time
                 if time:
                     final_response = f"Your appointment is with {doctor_name} on {date} at {time}. If you need to change it, let me know!"
                 else:
@@ -178,22 +155,124 @@ def parse_response(stream: List[dict]) -> Tuple[str, str]:
 
     return tool_called_name, final_response.strip()
 
+def select_tool(ctx: RequestContext, final_response: str) -> Tuple[Optional[str], str]:
+    """Detect and run the tool for this turn given the full LLM response."""
+    with ctx.trace.span("tool_routing"):
+        decision = detect_tool(ctx.message, final_response)
+    with ctx.trace.span("tool_side_effects"):
+        return run_tool(decision, ctx, final_response)
+
+def route_message(ctx: RequestContext) -> Optional[Tuple[str, str]]:
+    """
+    Routing stage that runs before the model call.
+    If the user message alone already decides the tool, return (tool_called, response)
+    without calling Groq. Returns None when the LLM output is needed.
+    """
+    with ctx.trace.span("tool_routing"):
+        decision = detect_tool(ctx.message)
+    if decision.tool is None:
+        return None
+    with ctx.trace.span("tool_side_effects"):
+        return run_tool(decision, ctx)
+
+def classify_priority(message: str, recent_crisis: bool = False) -> Priority:
+    """
+    Upstream scheduling priority for a turn, from the same keyword sets used for tool routing.
+    Distress, and anything said shortly after an escalation, is CRITICAL; signs of strain are HIGH.
+    """
+    user_intents = detect_tool(message).user_intents
+    if "distress" in user_intents or recent_crisis:
+        return Priority.CRITICAL
+    if "concern" in user_intents:
+        return Priority.HIGH
+    return Priority.NORMAL
+
+def parse_response(stream: List[dict], ctx: RequestContext) -> Tuple[Optional[str], str]:
+    """
+    Parse the streamed response from Groq, extracting the final response and tool called (if any).
+    The user message comes from the request context; tools are checked against it first.
+    """
+    final_response = ""
+    for chunk in stream:
+        if chunk.get("content"):
+            final_response += chunk["content"]
+    return select_tool(ctx, final_response)
+
 # Mock graph object for streaming compatibility with main.py
 class Graph:
-    def stream(self, inputs: dict, stream_mode: str = "updates") -> List[dict]:
+    async def astream(self, inputs: dict, stream_mode: str = "updates",
+                      ctx: Optional[RequestContext] = None) -> List[dict]:
         """
-        Calls the Groq API in non-streaming mode to avoid backend timeout.
+        Whole completion for /ask and the batch runner. Collects the streamed
+        completion, so generation stops early when a tool is going to replace the
+        reply anyway (see astream_tokens). Raises UpstreamBusy when the queue is
+        full or the request was shed for a higher priority one,
+        and RateLimited when the caller's or the service's token budget is spent.
         """
-        client = Groq(api_key=GROQ_API_KEY)
-        response = client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=inputs["messages"],
-            max_tokens=350,
-            temperature=0.7,
-            top_p=0.9,
-            stream=False
-        )
-        # Wrap the response in a list of dicts to match expected output
-        return [{"content": response.choices[0].message.content.strip()}]
-
-graph = Graph()
\ No newline at end of file
+        parts = [token async for token in self.astream_tokens(inputs, ctx=ctx)]
+        return [{"content": "".join(parts).strip()}]
+
+    async def astream_tokens(self, inputs: dict, ctx: Optional[RequestContext] = None,
+                             stop_on_tool: bool = EARLY_TOOL_STOP) -> AsyncIterator[str]:
+        """
+        Streams the completion from Groq, yielding text deltas as they arrive.
+        Holds an upstream slot (in order of ctx.priority) for the lifetime of the stream.
+
+        With stop_on_tool, the text is scanned for tool keywords as it arrives (keywords
+        split across chunks included). Once a distress keyword shows up the reply is
+        certain to be replaced by the emergency response, whatever follows, so the
+        upstream stream is closed right away instead of paying for the rest of it.
+        Lower-ranked tools keep reading, since distress would still take precedence.
+        """
+        trace = ctx.trace if ctx is not None else RequestTrace("internal")
+        priority = ctx.priority if ctx is not None else Priority.NORMAL
+        scanner = INTENT_MATCHER.scanner() if stop_on_tool else None
+        # Reserve the worst-case cost before queueing, so an exhausted budget is refused at once
+        prompt_estimate = sum(count_tokens(m["content"]) for m in inputs["messages"])
+        reservation = await admission.areserve(ctx.session_id if ctx is not None else None,
+                                               ctx.client_ip if ctx is not None else None,
+                                               prompt_estimate + MAX_TOKENS, priority)
+        used, parts = None, []
+        try:
+            queued_at = time.perf_counter()
+            async with upstream_limiter.slot(priority):
+                started = time.perf_counter()
+                trace.add("upstream_queue", started - queued_at)
+                QUEUE_SECONDS.observe(started - queued_at, priority.name.lower())
+                stream = completion.stream(
+                    inputs["messages"],
+                    max_tokens=MAX_TOKENS,
+                    temperature=0.7,
+                    top_p=0.9
+                )
+                first_token = True
+                try:
+                    async for chunk in stream:
+                        usage = chunk.usage or (chunk.x_groq.usage if chunk.x_groq else None)
+                        if usage is not None:
+                            trace.add_usage(usage.prompt_tokens, usage.completion_tokens)
+                            used = usage.prompt_tokens + usage.completion_tokens
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            text = chunk.choices[0].delta.content
+                            parts.append(text)
+                            if first_token:
+                                trace.add("upstream_ttft", time.perf_counter() - started)
+                                first_token = False
+                            yield text
+                            # Only the top-ranked intent settles the tool: a medication or appointment
+                            # keyword can still be outranked by distress later in the reply
+                            if scanner is not None and TOOL_INTENTS[0] in scanner.feed(text):
+                                EARLY_STOPS.inc(TOOL_INTENTS[0])
+                                return
+                finally:
+                    trace.add("upstream_call", time.perf_counter() - started)
+                    await stream.aclose()
+        finally:
+            if used is None and parts:
+                # Streams closed early never report usage, but Groq still bills what was generated
+                completion_estimate = count_tokens("".join(parts))
+                trace.add_usage(prompt_estimate, completion_estimate)
+                used = prompt_estimate + completion_estimate
+            await admission.areconcile(reservation, used or 0)
+
+graph = Graph()
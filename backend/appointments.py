@@ -0,0 +1,132 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+# SQLite file shared by all workers on this host (override with APPOINTMENTS_DB)
+APPOINTMENTS_DB = os.getenv("APPOINTMENTS_DB",
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), "appointments.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS appointments (
+    id INTEGER PRIMARY KEY,
+    patient_id TEXT NOT NULL,
+    doctor TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT,
+    slot TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments (patient_id, created_at);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_slot ON appointments (doctor, slot) WHERE slot IS NOT NULL;
+"""
+
+_TIME = re.compile(r'(\d{1,2}):(\d{2})\s*([ap]m)?', re.IGNORECASE)
+
+
+class Appointment(NamedTuple):
+    patient_id: str
+    doctor: str
+    date: str
+    time: Optional[str]
+
+
+class SlotTaken(Exception):
+    """The requested slot is already booked by another patient."""
+
+
+def slot_key(date: str, time: Optional[str]) -> Optional[str]:
+    """
+    Normalized slot used for conflict detection, e.g. "12/08/2025 11:00am" -> "12/08/2025 11:00".
+    Bookings without a time don't reserve a slot.
+    """
+    if not time:
+        return None
+    parts = re.split(r'[/-]', date)
+    if len(parts[-1]) == 2:
+        parts[-1] = "20" + parts[-1]
+    day = "/".join(part.zfill(2) for part in parts)
+    match = _TIME.match(time.strip())
+    if not match:
+        return f"{day} {time.strip().lower()}"
+    hour, minute, meridiem = int(match.group(1)), match.group(2), (match.group(3) or "").lower()
+    if meridiem == "pm" and hour < 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    return f"{day} {hour:02d}:{minute}"
+
+
+class AppointmentStore:
+    """
+    Appointment records in SQLite (WAL mode), one current booking per patient.
+    Each thread gets its own connection, so lookups run concurrently instead of
+    queuing on a process-wide lock, and several uvicorn workers can share the file.
+    """
+
+    def __init__(self, path: str = APPOINTMENTS_DB):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def book(self, patient_id: str, doctor: str, date: str, time_: Optional[str]) -> Appointment:
+        """Replace the patient's booking with this one. Raises SlotTaken if another patient holds the slot."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM appointments WHERE patient_id = ?", (patient_id,))
+            conn.execute(
+                "INSERT INTO appointments (patient_id, doctor, date, time, slot, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (patient_id, doctor, date, time_, slot_key(date, time_), time.time()),
+            )
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK")
+            raise SlotTaken(f"{doctor} is already booked at {date} {time_}") from None
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return Appointment(patient_id, doctor, date, time_)
+
+    def latest(self, patient_id: str) -> Optional[Appointment]:
+        row = self._connect().execute(
+            "SELECT patient_id, doctor, date, time FROM appointments WHERE patient_id = ? "
+            "ORDER BY created_at DESC LIMIT 1",
+            (patient_id,),
+        ).fetchone()
+        return Appointment(*row) if row else None
+
+    def is_available(self, doctor: str, date: str, time_: Optional[str]) -> bool:
+        slot = slot_key(date, time_)
+        if slot is None:
+            return True
+        row = self._connect().execute(
+            "SELECT 1 FROM appointments WHERE doctor = ? AND slot = ?", (doctor, slot)
+        ).fetchone()
+        return row is None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> AppointmentStore:
+    """Process-wide store, opened on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AppointmentStore()
+    return _store
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+from ai_agent import SYSTEM_PROMPT, detect_tool, graph, parse_response, route_message, run_tool
+from context import RequestContext
+from metrics import RequestTrace
+from ratelimit import RateLimited
+from scheduler import Priority, UpstreamBusy, upstream_limiter
+from sessions import CONTEXT_TOKEN_BUDGET, MAX_MESSAGE_CHARS, Session
+
+# Batch settings (override with environment variables)
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "8"))  # conversations replayed at once
+BATCH_MAX_BUDGET_WAIT = float(os.getenv("BATCH_MAX_BUDGET_WAIT", "120"))  # seconds a turn may wait for token budget
+
+
+@dataclass
+class Conversation:
+    index: int           # line number in the input
+    id: Optional[str]    # caller's id, echoed back
+    turns: List[str]
+
+
+def parse_rows(lines: Iterable[str]) -> Tuple[List[Conversation], List[dict]]:
+    """
+    Read JSONL rows of {"message": "..."} or {"turns": ["...", ...]} (optionally with an "id").
+    Returns the conversations and a result row for every line that couldn't be used.
+    """
+    conversations, invalid = [], []
+    for index, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            turns = row["turns"] if "turns" in row else [row["message"]]
+            if not isinstance(turns, list) or not turns:
+                raise ValueError("turns must be a non-empty list")
+            if not all(isinstance(turn, str) and turn.strip() for turn in turns):
+                raise ValueError("turns must be non-empty strings")
+            if any(len(turn) > MAX_MESSAGE_CHARS for turn in turns):
+                raise ValueError(f"turns must be at most {MAX_MESSAGE_CHARS} characters")
+        except (ValueError, KeyError, TypeError) as e:
+            invalid.append({"index": index, "route": "invalid", "error": f"{type(e).__name__}: {e}"})
+            continue
+        conversations.append(Conversation(index, row.get("id"), turns))
+    return conversations, invalid
+
+
+def new_context(session_id: str, message: str, dry_run: bool, client_ip: Optional[str]) -> RequestContext:
+    # Replays always yield to live patients, whatever the message says. They never place
+    # emergency calls, even live: every row is its own session, so dedup can't catch repeats
+    return RequestContext(message=message, session_id=session_id, trace=RequestTrace("batch"),
+                          priority=Priority.LOW, dry_run=dry_run, can_escalate=False, client_ip=client_ip)
+
+
+def result_row(conversation: Conversation, turn: int, ctx: RequestContext, route: str,
+               tool_called_name: Optional[str], final_response: str, error: Optional[str] = None) -> dict:
+    ctx.trace.finish(route, tool_called_name, ctx.request_id, ctx.session_id)
+    row = {
+        "index": conversation.index, "id": conversation.id, "turn": turn, "message": ctx.message,
+        "route": route, "tool_called": tool_called_name, "response": final_response,
+        "total_ms": round((time.perf_counter() - ctx.trace.start) * 1000, 2),
+        "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in ctx.trace.stages.items()},
+        "prompt_tokens": ctx.trace.prompt_tokens, "completion_tokens": ctx.trace.completion_tokens,
+    }
+    if error is not None:
+        row["error"] = error
+    return row
+
+
+def fast_path(conversations: List[Conversation], dry_run: bool,
+              client_ip: Optional[str] = None) -> Tuple[List[dict], List[Conversation]]:
+    """
+    Answer single-message rows that tool routing alone decides, in one pass and without
+    the event loop. Each distinct message is classified once however often it repeats.
+    Returns the finished rows and the conversations that still need the model.
+    """
+    singles = [c for c in conversations if len(c.turns) == 1]
+    began = time.perf_counter()
+    decisions = {message: detect_tool(message) for message in {c.turns[0] for c in singles}}
+    routing_share = (time.perf_counter() - began) / max(1, len(singles))
+
+    results, remaining = [], []
+    for conversation in conversations:
+        decision = decisions.get(conversation.turns[0]) if len(conversation.turns) == 1 else None
+        if decision is None or decision.tool is None:
+            remaining.append(conversation)
+            continue
+        ctx = new_context(f"batch-{uuid.uuid4().hex}", conversation.turns[0], dry_run, client_ip)
+        ctx.trace.add("tool_routing", routing_share)
+        with ctx.trace.span("tool_side_effects"):
+            tool_called_name, final_response = run_tool(decision, ctx)
+        results.append(result_row(conversation, 0, ctx, "tool", tool_called_name, final_response))
+    return results, remaining
+
+
+async def run_conversation(conversation: Conversation, dry_run: bool,
+                           client_ip: Optional[str] = None) -> AsyncIterator[dict]:
+    """Replay one conversation turn by turn through the /ask pipeline; stops at the first failed turn."""
+    session = Session(f"batch-{uuid.uuid4().hex}", CONTEXT_TOKEN_BUDGET)
+    for turn, message in enumerate(conversation.turns):
+        ctx = new_context(session.id, message, dry_run, client_ip)
+        try:
+            routed = await asyncio.to_thread(route_message, ctx)
+            if routed is not None:
+                route, (tool_called_name, final_response) = "tool", routed
+            else:
+                with ctx.trace.span("prompt_assembly"):
+                    inputs = {"messages": session.context_window(SYSTEM_PROMPT, message)}
+                waited = 0.0
+                while True:
+                    try:
+                        stream = await graph.astream(inputs, stream_mode="updates", ctx=ctx)
+                        break
+                    except RateLimited as e:
+                        # Replays pace themselves to the token budget instead of failing, up to a point
+                        if waited + e.retry_after > BATCH_MAX_BUDGET_WAIT:
+                            raise
+                        waited += e.retry_after
+                        await asyncio.sleep(e.retry_after)
+                route, (tool_called_name, final_response) = "llm", await asyncio.to_thread(parse_response, stream, ctx)
+        except Exception as e:
+            # Later turns depend on this one, so the rest of the conversation is skipped
+            route = ("busy" if isinstance(e, UpstreamBusy) else
+                     "rate_limited" if isinstance(e, RateLimited) else "error")
+            yield result_row(conversation, turn, ctx, route, None, "", f"{type(e).__name__}: {e}")
+            return
+        session.add_exchange(message, final_response, tool_called_name)
+        yield result_row(conversation, turn, ctx, route, tool_called_name, final_response)
+
+
+async def run_batch(lines: Iterable[str], parallelism: int = BATCH_PARALLELISM,
+                    dry_run: bool = True, client_ip: Optional[str] = None) -> AsyncIterator[dict]:
+    """
+    Run JSONL input through the agent pipeline and yield one result row per turn as
+    soon as it is ready (so rows arrive out of order; use "index" and "turn").
+
+    Tool-only rows are answered first by the fast path. The rest are replayed by
+    `parallelism` workers at LOW upstream priority, so live traffic always goes first;
+    when the Groq token budget runs low they wait for it to refill (for up to
+    BATCH_MAX_BUDGET_WAIT seconds per turn, then the turn is reported as rate_limited).
+    With dry_run (the default) no appointments are booked; emergency calls are never placed.
+    Model calls are charged to client_ip's token budget, when given.
+    """
+    # Parsing and the fast path (including tool side effects and appointment lookups) run on
+    # a worker thread, so a large file doesn't hold up live requests on the event loop
+    conversations, invalid = await asyncio.to_thread(parse_rows, list(lines))
+    fast, remaining = await asyncio.to_thread(fast_path, conversations, dry_run, client_ip)
+    for row in invalid + fast:
+        yield row
+
+    pending: asyncio.Queue = asyncio.Queue()
+    for conversation in remaining:
+        pending.put_nowait(conversation)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        while not pending.empty():
+            conversation = pending.get_nowait()
+            async for row in run_conversation(conversation, dry_run, client_ip):
+                await results.put(row)
+
+    # More workers than the slots LOW traffic may use would only queue
+    usable_slots = upstream_limiter.max_in_flight - upstream_limiter.reserved_slots
+    workers = max(1, min(parallelism, usable_slots, len(remaining)))
+    tasks = [asyncio.ensure_future(worker()) for _ in range(workers)]
+    done = asyncio.ensure_future(asyncio.gather(*tasks))
+    done.add_done_callback(lambda _: results.put_nowait(None))
+    try:
+        while True:
+            row = await results.get()
+            if row is None:
+                break
+            yield row
+    finally:
+        # The consumer went away (e.g. the client disconnected): stop replaying
+        for task in tasks:
+            task.cancel()
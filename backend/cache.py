@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from intents import normalize
+
+# Response cache settings (override with environment variables)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a fixed TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl,
+                    "hits": self.hits, "misses": self.misses,
+                    "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                    "evictions": self.evictions, "expirations": self.expirations}
+
+
+class ResponseCache:
+    """
+    Caches replies keyed on (route, normalized message).
+    Callers decide what is cacheable; crisis turns must never be stored or served from here.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self._cache = TTLCache(maxsize, ttl)
+
+    @staticmethod
+    def key(route: str, message: str) -> tuple:
+        return route, " ".join(normalize(message).split())
+
+    def get(self, route: str, message: str) -> Optional[tuple]:
+        return self._cache.get(self.key(route, message))
+
+    def set(self, route: str, message: str, tool_called: Optional[str], response: str):
+        self._cache.set(self.key(route, message), (tool_called, response))
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,246 @@
+import asyncio
+import os
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from llm_client import get_async_client
+from metrics import registry
+
+# Resilience settings (override with environment variables)
+GROQ_MODELS = [m.strip() for m in os.getenv("GROQ_MODELS", "llama3-70b-8192,llama3-8b-8192").split(",") if m.strip()]
+GROQ_DEADLINE = float(os.getenv("GROQ_DEADLINE", "20"))              # whole call, all fallbacks included
+GROQ_ATTEMPT_TIMEOUT = float(os.getenv("GROQ_ATTEMPT_TIMEOUT", "8"))  # one model, until the reply (or first token)
+GROQ_HEDGE_AFTER = float(os.getenv("GROQ_HEDGE_AFTER", "0"))          # start the next model after this many seconds; 0 = off
+BREAKER_FAILURES = int(os.getenv("GROQ_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("GROQ_BREAKER_COOLDOWN", "30"))
+
+MODEL_CALLS = registry.counter("llm_model_calls_total", "Groq attempts by model and outcome.", ("model", "outcome"))
+
+
+class UpstreamUnavailable(Exception):
+    """No model answered within the deadline (or every circuit breaker is open)."""
+
+
+def is_request_error(error: BaseException) -> bool:
+    """
+    A 4xx from Groq other than 408/409/429 (e.g. context length exceeded): the request
+    itself is at fault, so it says nothing about the model's health and no fallback will fix it.
+    Timeouts, connection errors, 5xx and 429 carry no such status and count as failures.
+    """
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in (408, 409, 429)
+
+
+class CircuitBreaker:
+    """
+    Opens after a run of consecutive failures and rejects traffic for a cooldown;
+    after that a single trial request is let through (half-open) to probe recovery.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failure_threshold = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_cancelled(self):
+        # A cancelled trial (e.g. a hedge that lost) says nothing about health; allow another probe
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class ResilientCompletion:
+    """
+    Groq chat completions with a deadline, ordered model fallback, optional hedging
+    and a circuit breaker per model.
+
+    Each attempt gets GROQ_ATTEMPT_TIMEOUT (capped by what is left of the deadline).
+    If an attempt fails the next healthy model is tried; with hedging enabled the
+    next model is also started when the current one hasn't answered after
+    GROQ_HEDGE_AFTER seconds, and whichever finishes first wins. For streams an
+    attempt "finishes" at its first token, so fallback never happens mid-reply.
+    """
+
+    def __init__(self, models: List[str] = GROQ_MODELS, deadline: float = GROQ_DEADLINE,
+                 attempt_timeout: float = GROQ_ATTEMPT_TIMEOUT, hedge_after: float = GROQ_HEDGE_AFTER):
+        self.models = models
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.hedge_after = hedge_after
+        self.breakers: Dict[str, CircuitBreaker] = {model: CircuitBreaker() for model in models}
+        self._client = None
+
+    def _get_client(self):
+        # Fallback replaces the SDK's own retries, which would otherwise eat the deadline
+        if self._client is None:
+            self._client = get_async_client().with_options(max_retries=0)
+        return self._client
+
+    async def _attempt(self, model: str, run: Callable[[str], Awaitable], timeout: float):
+        try:
+            result = await asyncio.wait_for(run(model), timeout)
+        except asyncio.CancelledError:
+            self.breakers[model].record_cancelled()
+            MODEL_CALLS.inc(model, "cancelled")
+            raise
+        except Exception as e:
+            if is_request_error(e):
+                # The model answered; only the request was bad
+                self.breakers[model].record_success()
+                MODEL_CALLS.inc(model, "rejected")
+            else:
+                self.breakers[model].record_failure()
+                MODEL_CALLS.inc(model, "error")
+            raise
+        self.breakers[model].record_success()
+        MODEL_CALLS.inc(model, "ok")
+        return model, result
+
+    async def _race(self, run: Callable[[str], Awaitable], discard: Optional[Callable] = None):
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + self.deadline
+        candidates = iter(self.models)
+        pending = set()
+        last_error = None
+
+        def launch() -> bool:
+            for model in candidates:
+                if self.breakers[model].allow():
+                    timeout = min(self.attempt_timeout, deadline_at - loop.time())
+                    pending.add(asyncio.ensure_future(self._attempt(model, run, timeout)))
+                    return True
+                MODEL_CALLS.inc(model, "breaker_open")
+            return False
+
+        if not launch():
+            raise UpstreamUnavailable("all models are unavailable (circuit open)")
+        try:
+            while pending:
+                remaining = deadline_at - loop.time()
+                if remaining <= 0:
+                    break
+                wait = min(self.hedge_after, remaining) if self.hedge_after > 0 else remaining
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Hedge: the current attempt is slow, start the next model alongside it
+                    launch()
+                    continue
+                winner = None
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is not None:
+                        if is_request_error(task.exception()):
+                            raise task.exception()
+                        last_error = task.exception()
+                    elif winner is None:
+                        winner = task.result()
+                    elif discard is not None:
+                        await discard(task.result()[1])
+                if winner is not None:
+                    return winner
+                if not pending:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            for task in pending:
+                try:
+                    _, result = await task
+                except BaseException:
+                    continue
+                if discard is not None:
+                    await discard(result)
+        raise UpstreamUnavailable("no model answered before the deadline") from last_error
+
+    async def create(self, messages: List[dict], **params):
+        """Non-streaming completion; returns (model, response)."""
+        async def run(model):
+            return await self._get_client().chat.completions.create(model=model, messages=messages, **params)
+        return await self._race(run)
+
+    async def stream(self, messages: List[dict], **params) -> AsyncIterator:
+        """
+        Streaming completion. Yields chunks from the first model to produce a token;
+        after that, chunks must keep arriving before the overall deadline.
+        """
+        async def run(model):
+            stream = await self._get_client().chat.completions.create(model=model, messages=messages,
+                                                                     stream=True, **params)
+            iterator = stream.__aiter__()
+            buffered = []
+            try:
+                # Wait for real content so "first token" is what wins the race
+                while True:
+                    chunk = await iterator.__anext__()
+                    buffered.append(chunk)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        return stream, iterator, buffered
+            except StopAsyncIteration:
+                return stream, iterator, buffered
+            except BaseException:
+                await stream.close()
+                raise
+
+        async def discard(result):
+            await result[0].close()
+
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + self.deadline
+        _, (stream, iterator, buffered) = await self._race(run, discard)
+        try:
+            for chunk in buffered:
+                yield chunk
+            while True:
+                remaining = deadline_at - loop.time()
+                if remaining <= 0:
+                    raise UpstreamUnavailable("stream exceeded the deadline")
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), remaining)
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        finally:
+            await stream.close()
+
+    def stats(self) -> dict:
+        # 0 = closed, 1 = half open, 2 = open
+        codes = {"closed": 0, "half_open": 1, "open": 2}
+        return {f"breaker_{model.replace('-', '_').replace('.', '_')}": codes[breaker.state]
+                for model, breaker in self.breakers.items()}
+
+
+completion = ResilientCompletion()
@@ -0,0 +1,21 @@
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+from metrics import RequestTrace
+from scheduler import Priority
+
+
+@dataclass
+class RequestContext:
+    """
+    Per-request state passed explicitly from the endpoint through the agent and tool routing.
+    """
+    message: str
+    session_id: Optional[str] = None
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    trace: RequestTrace = field(default_factory=lambda: RequestTrace("internal"))
+    priority: Priority = Priority.NORMAL
+    dry_run: bool = False  # evaluate the turn without side effects (no emergency calls, no bookings)
+    can_escalate: bool = True  # False for batch replays and distress turns over the rate limit: no call placed
+    client_ip: Optional[str] = None  # caller's address, for per-client rate limits
@@ -0,0 +1,172 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+# Escalation settings (override with environment variables)
+EMERGENCY_CALLS_ENABLED = os.getenv("EMERGENCY_CALLS_ENABLED", "0") == "1"  # real Twilio calls are opt-in
+ESCALATION_DEDUP_WINDOW = float(os.getenv("ESCALATION_DEDUP_WINDOW", "300"))
+ESCALATION_ADDRESS_LIMIT = int(os.getenv("ESCALATION_ADDRESS_LIMIT", "2"))  # calls per dedup window per client address
+ESCALATION_MAX_ATTEMPTS = int(os.getenv("ESCALATION_MAX_ATTEMPTS", "3"))
+ESCALATION_BACKOFF = float(os.getenv("ESCALATION_BACKOFF", "1"))
+ESCALATION_QUEUE_SIZE = int(os.getenv("ESCALATION_QUEUE_SIZE", "1000"))
+
+logger = logging.getLogger("safespace.escalation")
+
+
+class Escalation(NamedTuple):
+    session_id: str
+    request_id: str
+    queued_at: float
+    client_ip: Optional[str] = None
+
+
+class EmergencyDispatcher:
+    """
+    Places emergency calls from a background thread so the chat reply never waits on Twilio.
+
+    Repeated triggers from the same session inside the dedup window are collapsed
+    into the first one while it is pending or once it has gone through. Session ids
+    come from the client, so each client address is also limited to `address_limit`
+    calls per window. An escalation that is dropped or fails every attempt stops
+    counting, so the next trigger calls again. Failed calls are retried with exponential backoff. The
+    Twilio client enforces the per-attempt timeout.
+    """
+
+    def __init__(self, place_call: Optional[Callable[[], object]] = None,
+                 dedup_window: float = ESCALATION_DEDUP_WINDOW,
+                 address_limit: int = ESCALATION_ADDRESS_LIMIT,
+                 max_attempts: int = ESCALATION_MAX_ATTEMPTS,
+                 backoff: float = ESCALATION_BACKOFF,
+                 queue_size: int = ESCALATION_QUEUE_SIZE):
+        self._place_call = place_call
+        self.dedup_window = dedup_window
+        self.address_limit = address_limit
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._recent = {}      # session id -> stamp of its pending or placed escalation
+        self._by_address = {}  # client address -> stamps of its pending or placed escalations
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self.counters = {"submitted": 0, "deduplicated": 0, "address_limited": 0, "dropped": 0,
+                         "dispatched": 0, "retries": 0, "failed": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counters[key] += 1
+
+    def submit(self, session_id: str, request_id: str = "", client_ip: Optional[str] = None) -> bool:
+        """Queue an escalation; returns False if it was deduplicated, over its address's limit or the queue is full."""
+        now = time.monotonic()
+        with self._lock:
+            last = self._recent.get(session_id)
+            if last is not None and now - last < self.dedup_window:
+                self.counters["deduplicated"] += 1
+                return False
+            stamps = [t for t in self._by_address.get(client_ip, ()) if now - t < self.dedup_window]
+            if client_ip and len(stamps) >= self.address_limit:
+                self.counters["address_limited"] += 1
+                return False
+            self._recent[session_id] = now
+            if client_ip:
+                self._by_address[client_ip] = stamps + [now]
+            if len(self._recent) + len(self._by_address) > 10 * self._queue.maxsize:
+                self._recent = {sid: t for sid, t in self._recent.items() if now - t < self.dedup_window}
+                self._by_address = {ip: kept for ip, ts in self._by_address.items()
+                                    if (kept := [t for t in ts if now - t < self.dedup_window])}
+            self.counters["submitted"] += 1
+        job = Escalation(session_id, request_id, now, client_ip)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._forget(job)
+            self._count("dropped")
+            logger.error("Escalation queue full, dropping escalation for session %s", session_id)
+            return False
+        self._ensure_worker()
+        return True
+
+    def _forget(self, job: Escalation):
+        # Only clear this escalation's stamps, not ones left by a later escalation
+        with self._lock:
+            if self._recent.get(job.session_id) == job.queued_at:
+                del self._recent[job.session_id]
+            stamps = self._by_address.get(job.client_ip)
+            if stamps and job.queued_at in stamps:
+                stamps.remove(job.queued_at)
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopping.clear()
+                    self._thread = threading.Thread(target=self._run, name="emergency-dispatcher", daemon=True)
+                    self._thread.start()
+
+    def _call(self):
+        if self._place_call is None:
+            from tools import call_emergency
+            self._place_call = call_emergency
+        return self._place_call()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self._dispatch(job)
+            finally:
+                self._queue.task_done()
+
+    def _dispatch(self, job: Escalation):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self._call()
+                self._count("dispatched")
+                logger.info("Emergency call placed for session %s after %.2fs", job.session_id,
+                            time.monotonic() - job.queued_at)
+                return
+            except Exception as e:
+                logger.warning("Emergency call attempt %d for session %s failed: %s", attempt, job.session_id, e)
+                if attempt < self.max_attempts:
+                    self._count("retries")
+                    if self._stopping.wait(self.backoff * 2 ** (attempt - 1)):
+                        break
+        self._forget(job)
+        self._count("failed")
+        logger.error("Emergency call for session %s failed after %d attempts", job.session_id, self.max_attempts)
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """Wait until queued escalations have been handled (used on shutdown and in checks)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        self.drain(timeout)
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, queued=self._queue.qsize())
+
+
+dispatcher = EmergencyDispatcher()
+
+
+def escalate(session_id: str, request_id: str = "", client_ip: Optional[str] = None) -> bool:
+    """Hand an emergency off to the background dispatcher (no-op when calls are disabled)."""
+    if not EMERGENCY_CALLS_ENABLED:
+        return False
+    return dispatcher.submit(session_id, request_id, client_ip)
@@ -0,0 +1,171 @@
+import re
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple
+
+# Keyword tables used for tool routing. Matching is substring based on normalized
+# text (lowercase, punctuation stripped), so phrases should be written the same way.
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "distress": [
+        # direct crisis
+        "crisis", "emergency", "hurt myself", "kill myself", "end my life", "suicidal", "die", "cant go on", "give up", "ending my life", "no reason to live", "need help immediately", "urgent help", "im in a crisis", "i am in crisis", "need help now", "suicide",
+        "self harm", "selfharm", "harm myself", "harming myself",
+        # indirect/colloquial
+        "panic attack", "panic", "anxiety attack", "feel unsafe", "need to call me", "call me now", "need urgent help", "need someone to talk to urgently", "need immediate help", "help me now", "talk to me now", "need to talk now", "need support now",
+        # call-related
+        "phone call", "call me", "want to talk", "call doctor", "call therapist", "want phone call", "need phone call", "can you call me", "can i get a call"
+    ],
+    "medication": [
+        "medication", "medicine", "prescribe", "antidepressant", "meds", "prescription", "take my meds", "medication advice", "medicine for depression", "medicine for anxiety",
+        # indirect/colloquial
+        "should i take pills", "should i take medicine", "do i need medication", "can you give me medicine", "can you prescribe something", "should i use antidepressants", "should i use anxiety medication"
+    ],
+    "appointment": [
+        "appointment", "book", "schedule", "see a doctor", "visit a doctor", "make an appointment", "doctor appointment", "consultation", "book a session", "want appointment", "need appointment",
+        # indirect/colloquial
+        "find doctor", "find therapist", "therapist near me", "doctor near me", "want doctor like you", "need to see someone", "need to see a doctor", "can i see you", "can i book with you", "can i talk to a doctor", "can i talk to a therapist",
+        # call-related
+        "phone call", "call me", "want to talk", "call doctor", "call therapist", "want phone call", "need phone call", "can you call me", "can i get a call"
+    ],
+    # Asking for specific drug names (answered with the general medication classes)
+    "medication_request": [
+        "suggest medicine", "suggest medicines", "what medicine", "what medicines", "which medicine", "which medicines", "recommend medicine", "recommend medicines", "medicine name", "medication name", "drug name", "antidepressant name", "anxiety medicine"
+    ],
+    # Asking for details/confirmation or who the appointment is with
+    "appointment_details": [
+        "details", "confirm", "where", "when", "info", "information", "summary", "remind", "reminder",
+        "who is my appointment with", "to whom", "with whom", "who am i seeing", "doctor name", "therapist name", "who is my doctor", "who is my therapist"
+    ],
+    # Signs of strain short of a crisis; no tool fires, but the turn is scheduled ahead of routine traffic
+    "concern": [
+        "hopeless", "worthless", "cant cope", "cant take it", "overwhelmed", "falling apart", "breaking down", "cant stop crying",
+        "no one cares", "nobody cares", "all alone", "so lonely", "empty inside", "feel numb", "cant breathe", "shaking", "scared"
+    ],
+}
+
+_NON_WORD = re.compile(r'[^a-z0-9\s]')
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD.sub('', text.lower())
+
+
+class IntentMatch(NamedTuple):
+    intent: str
+    keyword: str
+    start: int
+    end: int
+
+
+def _trie_pattern(node: dict) -> str:
+    """Render a character trie as a regex; optional tails are greedy, so the longest keyword wins."""
+    terminal = "" in node
+    branches = [re.escape(char) + _trie_pattern(child)
+                for char, child in sorted(node.items()) if char != ""]
+    if not branches:
+        return ""
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")" + ("?" if terminal else "")
+
+
+class IntentMatcher:
+    """
+    Matches many keyword sets against normalized text in a single pass.
+
+    All keywords are compiled once into one trie-shaped regex wrapped in a lookahead,
+    so every start position is tried once and overlapping keywords are still found.
+    At a given position the regex reports the longest keyword; shorter keywords that
+    are prefixes of it are recovered from a precomputed table, which keeps the result
+    identical to checking `keyword in text` for every keyword.
+    """
+
+    def __init__(self, keyword_sets: Dict[str, Iterable[str]]):
+        owners: Dict[str, List[str]] = {}
+        for intent, keywords in keyword_sets.items():
+            for keyword in keywords:
+                keyword = normalize(keyword)
+                if keyword and intent not in owners.setdefault(keyword, []):
+                    owners[keyword].append(intent)
+
+        trie: dict = {}
+        for keyword in owners:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = True
+
+        # keyword -> every (intent, keyword) that matches whenever it matches at the same start
+        self._expansions: Dict[str, List[tuple]] = {}
+        for keyword in owners:
+            expansion = []
+            node = trie
+            for length, char in enumerate(keyword, 1):
+                node = node[char]
+                if "" in node:
+                    prefix = keyword[:length]
+                    expansion.extend((intent, prefix) for intent in owners[prefix])
+            self._expansions[keyword] = expansion
+        self._intent_sets: Dict[str, FrozenSet[str]] = {
+            keyword: frozenset(intent for intent, _ in expansion)
+            for keyword, expansion in self._expansions.items()
+        }
+        self.keyword_count = len(owners)
+        self.max_keyword_length = max((len(k) for k in owners), default=0)
+        self._regex = re.compile("(?=(" + _trie_pattern(trie) + "))") if owners else None
+
+    def scan_normalized(self, norm: str) -> List[IntentMatch]:
+        """Every keyword occurrence in already-normalized text, ordered by position."""
+        if self._regex is None:
+            return []
+        matches = []
+        for found in self._regex.finditer(norm):
+            start = found.start()
+            for intent, keyword in self._expansions[found.group(1)]:
+                matches.append(IntentMatch(intent, keyword, start, start + len(keyword)))
+        return matches
+
+    def scan(self, text: str) -> List[IntentMatch]:
+        return self.scan_normalized(normalize(text))
+
+    def intents_normalized(self, norm: str) -> FrozenSet[str]:
+        if self._regex is None:
+            return frozenset()
+        found = set()
+        for match in self._regex.finditer(norm):
+            found |= self._intent_sets[match.group(1)]
+        return frozenset(found)
+
+    def intents(self, text: str) -> FrozenSet[str]:
+        """The set of intents with at least one keyword in the text."""
+        return self.intents_normalized(normalize(text))
+
+    def scanner(self) -> "IncrementalScanner":
+        return IncrementalScanner(self)
+
+
+class IncrementalScanner:
+    """
+    Finds intents in text that arrives in pieces, such as streamed model tokens.
+
+    Normalization works character by character, so chunks can be normalized on their
+    own. The last max_keyword_length - 1 normalized characters are carried over to the
+    next chunk, which is enough for any keyword split across a boundary to be seen
+    whole. Each chunk costs O(chunk + tail) however long the text gets, and the union
+    of everything found equals `matcher.intents(full_text)`.
+    """
+
+    def __init__(self, matcher: IntentMatcher):
+        self.matcher = matcher
+        self.keep = max(0, matcher.max_keyword_length - 1)
+        self.tail = ""
+        self.intents: FrozenSet[str] = frozenset()
+
+    def feed(self, text: str) -> FrozenSet[str]:
+        """Scan the next chunk; returns the intents seen for the first time."""
+        norm = self.tail + normalize(text)
+        found = self.matcher.intents_normalized(norm) - self.intents
+        self.tail = norm[-self.keep:] if self.keep else ""
+        self.intents |= found
+        return found
+
+
+INTENT_MATCHER = IntentMatcher(INTENT_KEYWORDS)
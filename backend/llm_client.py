@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+    from groq import AsyncGroq
+
+# groq, httpx and config are imported on first use: they aren't needed until the first
+# model call and account for a large share of the worker's import time
+
+# Connection pool settings (override with environment variables)
+POOL_SIZE = int(os.getenv("GROQ_POOL_SIZE", "64"))
+KEEPALIVE_CONNECTIONS = int(os.getenv("GROQ_KEEPALIVE_CONNECTIONS", "32"))
+KEEPALIVE_EXPIRY = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "60"))
+REQUEST_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "30"))
+PREWARM_CONNECTIONS = int(os.getenv("GROQ_PREWARM_CONNECTIONS", "4"))  # 0 disables pre-warming
+PREWARM_TIMEOUT = float(os.getenv("GROQ_PREWARM_TIMEOUT", "5"))
+
+logger = logging.getLogger("safespace.upstream")
+
+_lock = threading.Lock()
+_async_client = None
+
+
+class ConnectionStats:
+    """Counts requests against new TCP connections and TLS handshakes so reuse can be verified."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _trace(self, event_name: str):
+        # httpcore reports "<step>.started" / ".complete" / ".failed"; count each completed step once
+        if event_name == "connection.connect_tcp.complete":
+            self._count("connections_opened")
+        elif event_name == "connection.start_tls.complete":
+            self._count("tls_handshakes")
+
+    async def on_async_request(self, request: "httpx.Request"):
+        self._count("requests")
+
+        async def trace(event_name, info):
+            self._trace(event_name)
+        request.extensions["trace"] = trace
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            reused = max(0, self.requests - self.connections_opened)
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "tls_handshakes": self.tls_handshakes,
+                "connections_reused": reused,
+                "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+            }
+
+
+connection_stats = ConnectionStats()
+
+
+def _limits() -> "httpx.Limits":
+    import httpx
+
+    return httpx.Limits(max_connections=POOL_SIZE,
+                        max_keepalive_connections=KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+def get_async_client() -> "AsyncGroq":
+    """Process-wide async Groq client for the event loop, created on first use."""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                import httpx
+                from groq import AsyncGroq
+                from config import GROQ_API_KEY
+
+                http_client = httpx.AsyncClient(limits=_limits(), timeout=REQUEST_TIMEOUT,
+                                                event_hooks={"request": [connection_stats.on_async_request]})
+                _async_client = AsyncGroq(api_key=GROQ_API_KEY, http_client=http_client)
+    return _async_client
+
+
+async def prewarm(connections: int = PREWARM_CONNECTIONS, timeout: float = PREWARM_TIMEOUT) -> int:
+    """
+    Import the Groq SDK and open `connections` pooled connections (TCP + TLS) with concurrent
+    model-list calls, so the first patients after a deploy or respawn don't pay for it.
+    Returns how many calls succeeded; failures are logged and never stop the worker from starting.
+    """
+    if connections <= 0:
+        return 0
+    client = get_async_client().with_options(max_retries=0, timeout=timeout)
+    results = await asyncio.gather(*(client.models.list() for _ in range(connections)), return_exceptions=True)
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures:
+        logger.warning("Groq pre-warm: %d of %d connections failed (%s)", len(failures), connections, failures[0])
+    return connections - len(failures)
+
+
+async def aclose():
+    """Close the shared client (called on application shutdown)."""
+    global _async_client
+    with _lock:
+        async_client, _async_client = _async_client, None
+    if async_client is not None:
+        await async_client.close()
@@ -1,36 +1,283 @@
 # Step1: Setup FastAPI backend
-from fastapi import FastAPI
-from pydantic import BaseModel
-import uvicorn
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
 
-from ai_agent import graph, SYSTEM_PROMPT, parse_response
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
-app = FastAPI()
+from ai_agent import graph, SYSTEM_PROMPT, classify_priority, detect_tool, parse_response, route_message, select_tool
+from appointments import get_store
+from batch import BATCH_PARALLELISM, run_batch
+from cache import response_cache
+from completion import completion
+from context import RequestContext
+from escalation import dispatcher
+from llm_client import aclose, connection_stats, prewarm
+from metrics import RequestTrace, registry
+from ratelimit import RateLimited, admission
+from scheduler import Priority, UpstreamBusy, upstream_limiter
+from sessions import MAX_MESSAGE_CHARS, session_store
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs before the worker accepts requests: load the Groq SDK, open upstream connections
+    # and the appointments database now rather than on the first patient's turn
+    await prewarm()
+    await run_in_threadpool(get_store)
+    yield
+    await aclose()
+    # Let queued emergency calls go out before the worker exits
+    await run_in_threadpool(dispatcher.stop)
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+class StampReceived:
+    """ASGI middleware recording when a request arrived, so body parsing/validation time can be measured."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope.setdefault("state", {})["received_at"] = time.perf_counter()
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(StampReceived)
+
+registry.gauges("upstream", "Upstream limiter state.", upstream_limiter.stats)
+registry.gauges("response_cache", "Response cache counters.", response_cache.stats)
+registry.gauges("groq_connections", "Groq connection pool reuse counters.", connection_stats.snapshot)
+registry.gauges("groq_models", "Circuit breaker state per model (0 closed, 1 half open, 2 open).", completion.stats)
+registry.gauges("escalation", "Emergency call dispatcher counters.", dispatcher.stats)
+registry.gauges("rate_limit", "Admission control counters.", admission.stats)
+registry.gauges("sessions", "Conversation store size.", lambda: {"active": len(session_store)})
+
+
+@app.get("/stats/connections")
+async def connections():
+    # Connection reuse counters for the shared Groq client
+    return connection_stats.snapshot()
+
+
+@app.get("/stats/cache")
+async def cache_stats():
+    return response_cache.stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 # Step2: Receive and validate request from Frontend
 class Query(BaseModel):
-    message: str
+    message: str = Field(max_length=MAX_MESSAGE_CHARS)
+    session_id: Optional[str] = None
+
+
+
+def start_request(endpoint: str, query: Query, request: Request) -> RequestContext:
+    received_at = getattr(request.state, "received_at", time.perf_counter())
+    trace = RequestTrace(endpoint, start=received_at)
+    trace.add("validation", time.perf_counter() - received_at)
+    # Only an existing session is looked up here; none is created until the request is admitted
+    existing = session_store.find(query.session_id)
+    priority = classify_priority(query.message, existing is not None and existing.in_crisis())
+    return RequestContext(message=query.message, session_id=existing.id if existing else None, trace=trace,
+                          priority=priority, client_ip=request.client.host if request.client else None)
+
+
+async def open_session(ctx: RequestContext, query: Query):
+    """Admit the request, then fetch or create its session; raises RateLimited before touching the store."""
+    await admit(ctx)
+    session = session_store.get(query.session_id)
+    ctx.session_id = session.id
+    return session
+
+
+def finish(ctx: RequestContext, route: str, tool_called_name, final_response: str) -> dict:
+    ctx.trace.finish(route, tool_called_name, ctx.request_id, ctx.session_id)
+    return {"response": final_response,
+            "tool_called": tool_called_name,
+            "route": route,
+            "session_id": ctx.session_id}
+
+
+BUSY_RESPONSE = "I'm with a lot of patients right now. Please try again in a moment."
+ERROR_RESPONSE = "I'm having trouble connecting. Please try again shortly."
+RATE_LIMITED_RESPONSE = "You're sending messages faster than I can keep up. Please wait a moment and try again."
+
+
+async def admit(ctx: RequestContext):
+    try:
+        await admission.aadmit(ctx.session_id, ctx.client_ip)
+    except RateLimited:
+        if detect_tool(ctx.message).tool != "emergency_call":
+            raise
+        # A distress message over the limit still gets the emergency response, but no further call
+        ctx.can_escalate = False
+
+
+def rate_limited(ctx: RequestContext, error: RateLimited) -> JSONResponse:
+    # 429 when the caller is over its own limits, 503 when the service-wide Groq budget is spent
+    client = error.scope == "client"
+    return JSONResponse(status_code=429 if client else 503,
+                        headers={"Retry-After": error.retry_after_header},
+                        content=finish(ctx, "rate_limited", None, RATE_LIMITED_RESPONSE if client else BUSY_RESPONSE))
+
+
+def remember(session, ctx: RequestContext, tool_called_name, final_response: str):
+    # Only completed turns are stored, so failed calls don't leave half a conversation behind
+    session.add_exchange(ctx.message, final_response, tool_called_name)
+
 
 
+def cacheable(session) -> bool:
+    # Only opening turns are cached: later replies depend on the conversation so far
+    return not session.turns
+
+
+def store_in_cache(ctx: RequestContext, tool_called_name, final_response: str):
+    # Replies that fired a tool (including a model-detected crisis) are never cached
+    if tool_called_name is None:
+        response_cache.set("llm", ctx.message, tool_called_name, final_response)
+
 
 @app.post("/ask")
-async def ask(query: Query):
+async def ask(query: Query, request: Request):
+    ctx = start_request("ask", query, request)
     try:
-        inputs = {"messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": query.message}
-        ]}
-        stream = graph.stream(inputs, stream_mode="updates")
-        tool_called_name, final_response = parse_response(stream)
-        return {"response": final_response,
-                "tool_called": tool_called_name}
+        session = await open_session(ctx, query)
+        # Tool-determined turns are answered directly, without a Groq round-trip. Tool side effects
+        # (bookings wait on the shared SQLite file) run on the threadpool, off the event loop
+        routed = await run_in_threadpool(route_message, ctx)
+        if routed is not None:
+            tool_called_name, final_response = routed
+            remember(session, ctx, tool_called_name, final_response)
+            return finish(ctx, "tool", tool_called_name, final_response)
+
+        use_cache = cacheable(session)
+        cached = response_cache.get("llm", ctx.message) if use_cache else None
+        if cached is not None:
+            tool_called_name, final_response = cached
+            remember(session, ctx, tool_called_name, final_response)
+            return finish(ctx, "cache", tool_called_name, final_response)
+
+        with ctx.trace.span("prompt_assembly"):
+            inputs = {"messages": session.context_window(SYSTEM_PROMPT, ctx.message)}
+        stream = await graph.astream(inputs, stream_mode="updates", ctx=ctx)
+        tool_called_name, final_response = await run_in_threadpool(parse_response, stream, ctx)
+        if use_cache:
+            store_in_cache(ctx, tool_called_name, final_response)
+        remember(session, ctx, tool_called_name, final_response)
+        return finish(ctx, "llm", tool_called_name, final_response)
+    except RateLimited as e:
+        return rate_limited(ctx, e)
+    except UpstreamBusy:
+        # Backpressure: fail fast rather than letting requests pile up on the worker
+        return JSONResponse(status_code=503,
+                            headers={"Retry-After": "1"},
+                            content=finish(ctx, "busy", None, BUSY_RESPONSE))
     except Exception as e:
         print(f"Error in /ask endpoint: {e}")
-        return {"response": "I'm having trouble connecting. Please try again shortly.",
-                "tool_called": None}
+        return finish(ctx, "error", None, ERROR_RESPONSE)
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/ask/stream")
+async def ask_stream(query: Query, request: Request):
+    """
+    Server-sent events version of /ask.
+    Emits "token" events as Groq produces text, then a trailing "done" event with
+    the final response and tool decision (the tool reply replaces the streamed text when a tool fires).
+    """
+    ctx = start_request("ask_stream", query, request)
+    try:
+        session = await open_session(ctx, query)
+    except RateLimited as e:
+        return rate_limited(ctx, e)
+
+    async def events():
+        try:
+            routed = await run_in_threadpool(route_message, ctx)
+            if routed is not None:
+                tool_called_name, final_response = routed
+                remember(session, ctx, tool_called_name, final_response)
+                yield sse_event("token", {"token": final_response})
+                yield sse_event("done", finish(ctx, "tool", tool_called_name, final_response))
+                return
+
+            use_cache = cacheable(session)
+            cached = response_cache.get("llm", ctx.message) if use_cache else None
+            if cached is not None:
+                tool_called_name, final_response = cached
+                remember(session, ctx, tool_called_name, final_response)
+                yield sse_event("token", {"token": final_response})
+                yield sse_event("done", finish(ctx, "cache", tool_called_name, final_response))
+                return
+
+            with ctx.trace.span("prompt_assembly"):
+                inputs = {"messages": session.context_window(SYSTEM_PROMPT, ctx.message)}
+            parts = []
+            async for token in graph.astream_tokens(inputs, ctx=ctx):
+                parts.append(token)
+                yield sse_event("token", {"token": token})
+            tool_called_name, final_response = await run_in_threadpool(select_tool, ctx, "".join(parts).strip())
+            if use_cache:
+                store_in_cache(ctx, tool_called_name, final_response)
+            remember(session, ctx, tool_called_name, final_response)
+            yield sse_event("done", finish(ctx, "llm", tool_called_name, final_response))
+        except RateLimited as e:
+            # The status line has already gone out, so the budget refusal travels in the done event
+            reply = RATE_LIMITED_RESPONSE if e.scope == "client" else BUSY_RESPONSE
+            yield sse_event("done", dict(finish(ctx, "rate_limited", None, reply), retry_after=e.retry_after_header))
+        except UpstreamBusy:
+            yield sse_event("done", finish(ctx, "busy", None, BUSY_RESPONSE))
+        except Exception as e:
+            print(f"Error in /ask/stream endpoint: {e}")
+            yield sse_event("done", finish(ctx, "error", None, ERROR_RESPONSE))
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/batch")
+async def batch(request: Request, parallelism: int = BATCH_PARALLELISM, dry_run: bool = True):
+    """
+    Bulk evaluation: the body is JSONL, one {"message": ...} or {"turns": [...]} per line.
+    Streams back one JSONL result per turn with its route, tool, reply and stage timings.
+    Runs at low upstream priority against the caller's token budget; dry_run=false lets
+    tools book appointments (replays never place emergency calls).
+    """
+    ctx = RequestContext(message="", trace=RequestTrace("batch"), priority=Priority.LOW,
+                         client_ip=request.client.host if request.client else None)
+    try:
+        await admit(ctx)
+    except RateLimited as e:
+        return rate_limited(ctx, e)
+    body = (await request.body()).decode("utf-8")
+
+    async def rows():
+        async for row in run_batch(body.splitlines(), max(1, parallelism), dry_run, ctx.client_ip):
+            yield json.dumps(row) + "\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
 
 
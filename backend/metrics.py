@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Set METRICS_LOG_REQUESTS=1 to emit one structured JSON log line per request
+LOG_REQUESTS = os.getenv("METRICS_LOG_REQUESTS", "0") == "1"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("safespace.requests")
+if LOG_REQUESTS:
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help_text, labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {total}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, labels
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # per-bucket counts (+Inf last), then sum and count
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {count}")
+        return lines
+
+
+class Registry:
+    """Holds metrics and gauge callbacks and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._gauges: List[Tuple[str, str, Callable[[], Dict[str, float]]]] = []
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauges(self, prefix: str, help_text: str, collect: Callable[[], Dict[str, float]]):
+        """Register a callback whose numeric values are exported as <prefix>_<key> gauges at scrape time."""
+        self._gauges.append((prefix, help_text, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, help_text, collect in self._gauges:
+            for key, value in collect().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# HELP {prefix}_{key} {help_text}")
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.counter("ask_requests_total", "Requests handled, by endpoint, route and tool.",
+                            ("endpoint", "route", "tool"))
+REQUEST_SECONDS = registry.histogram("ask_request_seconds", "End-to-end request latency.", ("endpoint", "route"))
+STAGE_SECONDS = registry.histogram("ask_stage_seconds", "Time spent in each pipeline stage.", ("stage",))
+QUEUE_SECONDS = registry.histogram("upstream_queue_seconds", "Time spent waiting for an upstream slot, by priority.",
+                                   ("priority",))
+TOKENS = registry.counter("llm_tokens_total", "Groq tokens used, by kind (prompt/completion).", ("kind",))
+
+
+class RequestTrace:
+    """
+    Timing spans for one request. Stage durations accumulate in a dict and are
+    only published to the shared histograms once, when the request finishes.
+    """
+
+    def __init__(self, endpoint: str, start: Optional[float] = None):
+        self.endpoint = endpoint
+        self.start = start if start is not None else time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @contextmanager
+    def span(self, stage: str):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - began)
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_usage(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+
+    def finish(self, route: str, tool: Optional[str], request_id: str = "", session_id: Optional[str] = None):
+        total = time.perf_counter() - self.start
+        REQUESTS.inc(self.endpoint, route, tool or "none")
+        REQUEST_SECONDS.observe(total, self.endpoint, route)
+        for stage, seconds in self.stages.items():
+            STAGE_SECONDS.observe(seconds, stage)
+        if self.prompt_tokens:
+            TOKENS.inc("prompt", amount=self.prompt_tokens)
+        if self.completion_tokens:
+            TOKENS.inc("completion", amount=self.completion_tokens)
+        if LOG_REQUESTS:
+            logger.info(json.dumps({
+                "request_id": request_id, "session_id": session_id, "endpoint": self.endpoint,
+                "route": route, "tool": tool, "total_ms": round(total * 1000, 2),
+                "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()},
+                "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+            }))
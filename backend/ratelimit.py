@@ -0,0 +1,314 @@
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from scheduler import Priority
+
+# Admission control settings (override with environment variables)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+SESSION_RPM = float(os.getenv("RATE_LIMIT_SESSION_RPM", "20"))       # requests per minute per conversation
+SESSION_TPM = float(os.getenv("RATE_LIMIT_SESSION_TPM", "12000"))    # Groq tokens per minute per conversation
+IP_RPM = float(os.getenv("RATE_LIMIT_IP_RPM", "120"))                # per client address (covers new sessions)
+IP_TPM = float(os.getenv("RATE_LIMIT_IP_TPM", "60000"))
+GROQ_RPM = float(os.getenv("GROQ_RPM", "0"))                          # account-wide quotas; 0 = not enforced
+GROQ_TPM = float(os.getenv("GROQ_TPM", "0"))
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "")                        # SQLite file shared by workers; empty = per process
+MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+LOW_PRIORITY_HEADROOM = float(os.getenv("RATE_LIMIT_LOW_PRIORITY_HEADROOM", "0.25"))  # budget share bulk traffic leaves alone
+
+
+class Limit(NamedTuple):
+    """A token bucket holding up to `capacity` that refills `capacity` every `period` seconds."""
+    capacity: float
+    period: float = 60.0
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+class RateLimited(Exception):
+    """
+    Admission was refused. `scope` is "client" when the caller is over its own limits
+    and "upstream" when the service-wide Groq budget is spent.
+    """
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"{scope} rate limit exceeded, retry in {retry_after:.1f}s")
+        self.scope = scope
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class BucketStore(ABC):
+    """
+    Token buckets stored as (level, updated_at). Levels refill lazily when read, so
+    idle buckets cost nothing; a bucket that has refilled completely is the same as
+    a missing one and can be dropped. Subclasses provide storage and atomicity.
+    """
+
+    blocking = False  # checks may wait on I/O or other processes, so keep them off the event loop
+
+    @abstractmethod
+    def _transaction(self):
+        ...
+
+    @abstractmethod
+    def _load(self, keys: Sequence[str]) -> Dict[str, Tuple[float, float]]:
+        ...
+
+    @abstractmethod
+    def _save(self, rows: List[Tuple[str, float, float, float]]):
+        ...
+
+    @abstractmethod
+    def _prune(self, now: float):
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @staticmethod
+    def _level(state: Optional[Tuple[float, float]], limit: Limit, now: float) -> float:
+        if state is None:
+            return limit.capacity
+        level, updated = state
+        return min(limit.capacity, level + (now - updated) * limit.rate)
+
+    @staticmethod
+    def _row(key: str, level: float, limit: Limit, now: float) -> Tuple[str, float, float, float]:
+        # full_at: when the bucket will be full again and can be forgotten
+        return key, level, now, now + max(0.0, limit.capacity - level) / limit.rate
+
+    def take(self, charges: Sequence[Tuple[str, float, Limit]],
+             headroom: float = 0.0) -> Tuple[float, Optional[str]]:
+        """
+        Take `amount` from every bucket, or from none of them. Returns (0, None) when
+        admitted, otherwise (seconds until it would fit, key of the bucket that is short).
+        `headroom` is the fraction of each bucket that must be left over afterwards.
+        """
+        now = time.time()
+        with self._transaction():
+            states = self._load([key for key, _, _ in charges])
+            levels = [self._level(states.get(key), limit, now) for key, _, limit in charges]
+            wait, short = 0.0, None
+            for (key, amount, limit), level in zip(charges, levels):
+                # A charge bigger than the whole bucket (headroom included) is admitted once it is full
+                needed = min(amount + headroom * limit.capacity, limit.capacity)
+                if level < needed and (needed - level) / limit.rate > wait:
+                    wait, short = (needed - level) / limit.rate, key
+            if short is not None:
+                return wait, short
+            self._save([self._row(key, level - amount, limit, now)
+                        for (key, amount, limit), level in zip(charges, levels)])
+            self._prune(now)
+        return 0.0, None
+
+    def adjust(self, charges: Sequence[Tuple[str, float, Limit]]):
+        """Charge more (positive) or refund (negative) without admission checks."""
+        now = time.time()
+        with self._transaction():
+            states = self._load([key for key, _, _ in charges])
+            self._save([self._row(key, min(limit.capacity, self._level(states.get(key), limit, now) - amount),
+                                  limit, now)
+                        for key, amount, limit in charges])
+
+
+class MemoryBucketStore(BucketStore):
+    """Buckets for a single worker process."""
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _transaction(self):
+        return self._lock
+
+    def _load(self, keys):
+        return {key: self._buckets[key][:2] for key in keys if key in self._buckets}
+
+    def _save(self, rows):
+        for key, level, updated, full_at in rows:
+            self._buckets[key] = (level, updated, full_at)
+
+    def _prune(self, now):
+        if len(self._buckets) > self.max_buckets:
+            for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+                del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBucketStore(BucketStore):
+    """
+    Buckets in a SQLite file (WAL mode) so every worker on the host draws from the
+    same budget. Each check is one short BEGIN IMMEDIATE transaction.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS buckets (
+        key TEXT PRIMARY KEY,
+        level REAL NOT NULL,
+        updated REAL NOT NULL,
+        full_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_buckets_full_at ON buckets (full_at);
+    """
+    PRUNE_EVERY = 1000  # transactions between sweeps of refilled buckets
+    blocking = True     # BEGIN IMMEDIATE can wait up to the busy timeout for other workers
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._connect().executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _load(self, keys):
+        placeholders = ",".join("?" * len(keys))
+        rows = self._connect().execute(
+            f"SELECT key, level, updated FROM buckets WHERE key IN ({placeholders})", list(keys)).fetchall()
+        return {key: (level, updated) for key, level, updated in rows}
+
+    def _save(self, rows):
+        self._connect().executemany("INSERT OR REPLACE INTO buckets (key, level, updated, full_at) VALUES (?, ?, ?, ?)",
+                                    rows)
+
+    def _prune(self, now):
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._connect().execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+class Reservation(NamedTuple):
+    charges: Tuple[Tuple[str, float, Limit], ...]  # token buckets charged for this call
+    estimate: int
+
+
+class AdmissionControl:
+    """
+    Per-client token buckets (requests and Groq tokens, by session and by IP) plus the
+    service-wide Groq RPM/TPM budget.
+
+    Every request takes one request token from its client's buckets. Turns that need
+    the model also reserve their estimated cost (prompt plus max_tokens) from the
+    client's and the service's token buckets before the call; once the real usage is
+    known the difference is refunded or charged. Rejections are immediate and carry
+    a Retry-After, so callers never sit in a queue for a budget that isn't there.
+    """
+
+    def __init__(self, store: BucketStore, enabled: bool = RATE_LIMIT_ENABLED):
+        self.store = store
+        self.enabled = enabled
+        self.session_requests, self.session_tokens = Limit(SESSION_RPM), Limit(SESSION_TPM)
+        self.ip_requests, self.ip_tokens = Limit(IP_RPM), Limit(IP_TPM)
+        self.upstream_requests = Limit(GROQ_RPM) if GROQ_RPM > 0 else None
+        self.upstream_tokens = Limit(GROQ_TPM) if GROQ_TPM > 0 else None
+        self.rejected = {"client": 0, "upstream": 0}
+        self.reconciled_tokens = 0
+
+    def _take(self, charges, headroom: float = 0.0):
+        wait, short = self.store.take(charges, headroom)
+        if short is not None:
+            scope = "upstream" if short.startswith("groq:") else "client"
+            self.rejected[scope] += 1
+            raise RateLimited(scope, wait)
+
+    def admit(self, session_id: Optional[str], ip: Optional[str]):
+        """Charge one request to the client; raises RateLimited."""
+        if not self.enabled:
+            return
+        charges = []
+        if session_id:
+            charges.append((f"session-req:{session_id}", 1, self.session_requests))
+        if ip:
+            charges.append((f"ip-req:{ip}", 1, self.ip_requests))
+        if charges:
+            self._take(charges)
+
+    def reserve(self, session_id: Optional[str], ip: Optional[str], estimate: int,
+                priority: int = Priority.NORMAL) -> Optional[Reservation]:
+        """
+        Reserve the estimated Groq cost of one model call; raises RateLimited. Every
+        model call is held to the budgets, crisis follow-ups included.
+        """
+        if not self.enabled:
+            return None
+        tokens = []
+        if session_id:
+            tokens.append((f"session-tok:{session_id}", estimate, self.session_tokens))
+        if ip:
+            tokens.append((f"ip-tok:{ip}", estimate, self.ip_tokens))
+        if self.upstream_tokens is not None:
+            tokens.append(("groq:tokens", estimate, self.upstream_tokens))
+        charges = list(tokens)
+        if self.upstream_requests is not None:
+            charges.append(("groq:requests", 1, self.upstream_requests))
+        # Bulk traffic leaves headroom in the token budgets for patients
+        self._take(charges, headroom=LOW_PRIORITY_HEADROOM if priority >= Priority.LOW else 0.0)
+        return Reservation(tuple(tokens), estimate)
+
+    def reconcile(self, reservation: Optional[Reservation], actual: int):
+        """Settle a reservation against the tokens the call really used."""
+        if reservation is None or not reservation.charges or actual == reservation.estimate:
+            return
+        delta = actual - reservation.estimate
+        self.store.adjust([(key, delta, limit) for key, _, limit in reservation.charges])
+        self.reconciled_tokens += delta
+
+    async def _off_loop(self, func, *args):
+        if self.enabled and self.store.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def aadmit(self, session_id: Optional[str], ip: Optional[str]):
+        await self._off_loop(self.admit, session_id, ip)
+
+    async def areserve(self, session_id: Optional[str], ip: Optional[str], estimate: int,
+                       priority: int = Priority.NORMAL) -> Optional[Reservation]:
+        return await self._off_loop(self.reserve, session_id, ip, estimate, priority)
+
+    async def areconcile(self, reservation: Optional[Reservation], actual: int):
+        await self._off_loop(self.reconcile, reservation, actual)
+
+    def stats(self) -> dict:
+        return {"enabled": int(self.enabled), "rejected_client": self.rejected["client"],
+                "rejected_upstream": self.rejected["upstream"], "reconciled_tokens": self.reconciled_tokens,
+                "buckets": len(self.store)}
+
+
+admission = AdmissionControl(SQLiteBucketStore(RATE_LIMIT_DB) if RATE_LIMIT_DB else MemoryBucketStore())
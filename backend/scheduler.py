@@ -0,0 +1,136 @@
+import asyncio
+import heapq
+import itertools
+import os
+from contextlib import asynccontextmanager
+from enum import IntEnum
+
+# Upstream concurrency settings (override with environment variables)
+MAX_IN_FLIGHT = int(os.getenv("GROQ_MAX_CONCURRENCY", "32"))
+MAX_QUEUE = int(os.getenv("GROQ_MAX_QUEUE", "256"))
+QUEUE_TIMEOUT = float(os.getenv("GROQ_QUEUE_TIMEOUT", "30"))
+RESERVED_SLOTS = int(os.getenv("GROQ_RESERVED_SLOTS", "4"))
+PRIORITY_SCHEDULING = os.getenv("GROQ_PRIORITY_SCHEDULING", "1") == "1"
+
+
+class Priority(IntEnum):
+    """Lower value is served first."""
+    CRITICAL = 0   # distress, or a conversation that escalated recently; never shed
+    HIGH = 1       # signs of emotional strain
+    NORMAL = 2
+    LOW = 3        # bulk / offline traffic
+
+
+class UpstreamBusy(Exception):
+    """Raised when an upstream slot cannot be obtained (queue full, shed, or wait timed out)."""
+
+
+class UpstreamLimiter:
+    """
+    Caps the number of in-flight Groq calls for this worker and decides who goes next.
+
+    Waiters are served by priority, then arrival order. The last RESERVED_SLOTS
+    slots are kept for HIGH and CRITICAL turns so background traffic can't take
+    the whole budget. When the queue is full, a newcomer displaces the lowest
+    priority waiter if it outranks it, otherwise it is rejected right away.
+    CRITICAL turns are never rejected or shed and wait without a timeout.
+    With priority scheduling disabled everything is NORMAL, i.e. plain FIFO.
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, max_queue: int = MAX_QUEUE,
+                 queue_timeout: float = QUEUE_TIMEOUT, reserved_slots: int = RESERVED_SLOTS,
+                 prioritize: bool = PRIORITY_SCHEDULING):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.reserved_slots = min(reserved_slots, max_in_flight - 1) if prioritize else 0
+        self.prioritize = prioritize
+        self.in_flight = 0
+        self.rejected = 0
+        self.shed = 0
+        self._waiters = []  # heap of (priority, seq, future); finished futures are skipped lazily
+        self._seq = itertools.count()
+
+    def _live_waiters(self):
+        return [entry for entry in self._waiters if not entry[2].done()]
+
+    @property
+    def queued(self) -> int:
+        return len(self._live_waiters())
+
+    def _can_start(self, priority: int) -> bool:
+        limit = self.max_in_flight if priority <= Priority.HIGH else self.max_in_flight - self.reserved_slots
+        return self.in_flight < limit
+
+    def _head(self):
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        return self._waiters[0] if self._waiters else None
+
+    def _wake(self):
+        # Hand free slots to waiters in priority order; if the head can't start, nobody behind it can
+        while True:
+            head = self._head()
+            if head is None or not self._can_start(head[0]):
+                return
+            heapq.heappop(self._waiters)
+            self.in_flight += 1
+            head[2].set_result(None)
+
+    def _make_room(self, priority: int):
+        live = self._live_waiters()
+        if len(live) < self.max_queue or priority == Priority.CRITICAL:
+            return
+        victims = [entry for entry in live if entry[0] > priority and entry[0] != Priority.CRITICAL]
+        if not victims:
+            self.rejected += 1
+            raise UpstreamBusy("upstream queue is full")
+        victim = max(victims, key=lambda entry: (entry[0], entry[1]))
+        victim[2].set_exception(UpstreamBusy("shed to make room for a higher priority request"))
+        self.shed += 1
+
+    async def acquire(self, priority: int = Priority.NORMAL):
+        if not self.prioritize:
+            priority = Priority.NORMAL
+        head = self._head()
+        if self._can_start(priority) and (head is None or head[0] > priority):
+            self.in_flight += 1
+            return
+        self._make_room(priority)
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), waiter))
+        timeout = None if priority == Priority.CRITICAL else self.queue_timeout
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # The slot was handed to us just as we gave up; pass it on
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise UpstreamBusy("timed out waiting for an upstream slot") from None
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = Priority.NORMAL):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        live = self._live_waiters()
+        stats = {"in_flight": self.in_flight, "queued": len(live), "rejected": self.rejected, "shed": self.shed,
+                 "max_in_flight": self.max_in_flight, "max_queue": self.max_queue}
+        for priority in Priority:
+            stats[f"queued_{priority.name.lower()}"] = sum(1 for entry in live if entry[0] == priority)
+        return stats
+
+
+upstream_limiter = UpstreamLimiter()
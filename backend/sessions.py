@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import List, Optional
+
+# Prompt budget settings (override with environment variables)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2048"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "256"))
+MAX_MESSAGE_CHARS = int(os.getenv("MAX_MESSAGE_CHARS", "4000"))  # longest patient message accepted
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "10000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+CRISIS_WINDOW = float(os.getenv("CRISIS_PRIORITY_WINDOW", "1800"))  # seconds a session stays high priority after a crisis
+
+# The summary quotes the patient, so it is sent with the patient's (user) role, never as a
+# system message, and fenced off so the model reads it as quoted context
+SUMMARY_HEADER = "For context, excerpts of what I (the patient) said earlier in this conversation, oldest first:"
+SUMMARY_FENCE = '"""'
+SNIPPET_CHARS = 160
+
+
+def count_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English), used for budgeting only."""
+    return len(text) // 4 + 1
+
+
+@dataclass
+class Turn:
+    role: str
+    content: str
+    tokens: int
+
+
+class Session:
+    """
+    Conversation history for one patient.
+    Token counts are computed once per turn and kept as a running total; once the
+    history exceeds its budget, or a turn no longer fits the prompt window, the
+    oldest turns are folded into a short summary, so memory and prompt size stay
+    bounded however long the chat runs and no turn is dropped unsummarized.
+    """
+
+    def __init__(self, session_id: str, history_budget: int, summary_budget: int = SUMMARY_TOKEN_BUDGET):
+        self.id = session_id
+        self.history_budget = history_budget
+        self.summary_budget = summary_budget
+        self.turns = deque()
+        self.history_tokens = 0
+        self.summary_snippets = deque()
+        self.summary_tokens = 0
+        self.last_seen = time.monotonic()
+        self.crisis_at = None
+
+    def mark_crisis(self):
+        self.crisis_at = time.monotonic()
+
+    def in_crisis(self, window: float = CRISIS_WINDOW) -> bool:
+        return self.crisis_at is not None and time.monotonic() - self.crisis_at < window
+
+    def add_exchange(self, message: str, reply: str, tool_called: Optional[str] = None):
+        """Store a completed user/assistant turn pair."""
+        self.add_turn("user", message)
+        self.add_turn("assistant", reply)
+        if tool_called == "emergency_call":
+            # Follow-up turns from this patient are scheduled ahead of everyone else for a while
+            self.mark_crisis()
+
+    def add_turn(self, role: str, content: str):
+        turn = Turn(role, content, count_tokens(content))
+        self.turns.append(turn)
+        self.history_tokens += turn.tokens
+        self.last_seen = time.monotonic()
+        while self.history_tokens > self.history_budget and len(self.turns) > 1:
+            self._fold(self.turns.popleft())
+
+    def _fold(self, turn: Turn):
+        self.history_tokens -= turn.tokens
+        # Only what the patient said is kept; the doctor's replies can be regenerated
+        if turn.role != "user":
+            return
+        snippet = turn.content if len(turn.content) <= SNIPPET_CHARS else turn.content[:SNIPPET_CHARS].rsplit(" ", 1)[0] + "…"
+        # Keep the patient's text from closing the fence early
+        snippet = " ".join(snippet.replace(SUMMARY_FENCE, "''").split())
+        self.summary_snippets.append(snippet)
+        # The budget covers the summary as sent, header and fences included
+        self.summary_tokens = count_tokens(self.summary)
+        while self.summary_tokens > self.summary_budget and len(self.summary_snippets) > 1:
+            self.summary_snippets.popleft()
+            self.summary_tokens = count_tokens(self.summary)
+
+    @property
+    def summary(self) -> Optional[str]:
+        if not self.summary_snippets:
+            return None
+        quoted = "\n".join(f"- {snippet}" for snippet in self.summary_snippets)
+        return f"{SUMMARY_HEADER}\n{SUMMARY_FENCE}\n{quoted}\n{SUMMARY_FENCE}"
+
+    def context_window(self, system_prompt: str, message: str, budget: int = CONTEXT_TOKEN_BUDGET) -> List[dict]:
+        """
+        Messages for the next Groq call: system prompt, summary of older turns (as a
+        quoted user message), as many recent turns as fit in the budget, then the new
+        user message. Stored turns that don't fit are folded into the summary first,
+        so they are summarized rather than silently left out.
+        """
+        available = budget - count_tokens(system_prompt) - count_tokens(message)
+        while True:
+            remaining = available - self.summary_tokens
+            fitting, used = 0, 0
+            for turn in reversed(self.turns):
+                if used + turn.tokens > remaining:
+                    break
+                fitting, used = fitting + 1, used + turn.tokens
+            if fitting == len(self.turns):
+                break
+            # Folding can grow the summary, so re-measure until the rest fits
+            while len(self.turns) > fitting:
+                self._fold(self.turns.popleft())
+
+        messages = [{"role": "system", "content": system_prompt}]
+        summary = self.summary
+        if summary is not None and self.summary_tokens <= available:
+            messages.append({"role": "user", "content": summary})
+        messages.extend({"role": turn.role, "content": turn.content} for turn in self.turns)
+        messages.append({"role": "user", "content": message})
+        return messages
+
+
+class SessionStore:
+    """In-memory session store with LRU eviction and an idle timeout."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL,
+                 history_budget: int = CONTEXT_TOKEN_BUDGET):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.history_budget = history_budget
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def find(self, session_id: Optional[str]) -> Optional[Session]:
+        """The live session for this id, if any; never creates one or changes its recency."""
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+        if session is None or time.monotonic() - session.last_seen > self.ttl:
+            return None
+        return session
+
+    def get(self, session_id: Optional[str] = None) -> Session:
+        """Return the session for this id, creating a new one (with a fresh id if none was given)."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None and now - session.last_seen > self.ttl:
+                del self._sessions[session_id]
+                session = None
+            if session is None:
+                session = Session(session_id or uuid.uuid4().hex, self.history_budget)
+                self._sessions[session.id] = session
+            else:
+                self._sessions.move_to_end(session.id)
+            session.last_seen = now
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+session_store = SessionStore()
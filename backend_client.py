@@ -0,0 +1,139 @@
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from chat_view import escape_text
+
+# Backend connection settings (override with environment variables)
+BACKEND_URLS = [u.strip().rstrip("/") for u in os.getenv("BACKEND_URLS", "http://localhost:8000").split(",") if u.strip()]
+BACKEND_POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "32"))          # connections kept per backend
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", "2"))
+BACKEND_BACKOFF = float(os.getenv("BACKEND_BACKOFF", "0.25"))          # base delay; full jitter, doubling per retry
+BACKEND_CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", "5"))
+BACKEND_READ_TIMEOUT = float(os.getenv("BACKEND_READ_TIMEOUT", "60"))  # max gap between streamed tokens
+
+RETRY_STATUSES = {502, 503, 504}
+
+
+class BackendClient:
+    """
+    One pooled HTTP session for every chat on this Streamlit server.
+
+    Requests are spread round-robin over BACKEND_URLS. A call is retried on the
+    next backend (after a jittered backoff) when it fails before any text arrives:
+    connection errors, 502/503/504, or a "busy" reply from an overloaded worker.
+    Once tokens have been shown the stream is never restarted.
+    """
+
+    def __init__(self, urls: List[str] = BACKEND_URLS, pool_size: int = BACKEND_POOL_SIZE,
+                 retries: int = BACKEND_RETRIES, backoff: float = BACKEND_BACKOFF):
+        self.urls = urls
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = (BACKEND_CONNECT_TIMEOUT, BACKEND_READ_TIMEOUT)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(urls), pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._next = itertools.cycle(urls)
+        self._lock = threading.Lock()
+
+    def next_url(self) -> str:
+        with self._lock:
+            return next(self._next)
+
+    def _delay(self, attempt: int):
+        time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+
+    def stream_reply(self, message: str, session_id: Optional[str] = None) -> Iterator[Tuple[str, object]]:
+        """
+        Calls /ask/stream and yields ("token", text) events followed by a single
+        ("done", data) event carrying the final response, tool and session id.
+        """
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._delay(attempt)
+            url = self.next_url()
+            try:
+                response = self.session.post(url + "/ask/stream",
+                                             json={"message": message, "session_id": session_id},
+                                             stream=True, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                continue
+            with response:
+                if response.status_code == 429:
+                    # The patient is over their own limit: show the reply, don't dodge it on another backend
+                    yield "done", response.json()
+                    return
+                if response.status_code in RETRY_STATUSES:
+                    last_error = requests.HTTPError(f"{response.status_code} from {url}", response=response)
+                    continue
+                response.raise_for_status()
+                streamed = False
+                for event, data in parse_events(response):
+                    if event == "token":
+                        streamed = True
+                        yield event, data["token"]
+                    elif event == "done":
+                        if not streamed and data.get("route") == "busy" and attempt < self.retries:
+                            break  # nothing shown yet, so another backend can take it
+                        yield event, data
+                        return
+                else:
+                    raise requests.ConnectionError(f"stream from {url} ended without a reply")
+                last_error = requests.HTTPError(f"{url} is busy")
+        raise last_error
+
+
+def parse_events(response: requests.Response) -> Iterator[Tuple[str, dict]]:
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):])
+
+
+class ReplyJob:
+    """
+    Streams one reply on a daemon thread so the Streamlit script never blocks on the
+    backend. The UI polls `text` (what has arrived so far, also kept escaped in
+    `escaped_text`) and `finished`, then reads `result` or `error`. The thread never
+    touches Streamlit state.
+    """
+
+    def __init__(self, client: BackendClient, message: str, session_id: Optional[str] = None):
+        self.message = message
+        self.text = ""
+        self.escaped_text = ""  # each token is escaped once as it arrives, not on every poll
+        self.result: Optional[dict] = None
+        self.error: Optional[Exception] = None
+        self._finished = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(client, session_id), daemon=True)
+        self._thread.start()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def _run(self, client: BackendClient, session_id: Optional[str]):
+        try:
+            for event, data in client.stream_reply(self.message, session_id):
+                if event == "token":
+                    self.text += data
+                    self.escaped_text += escape_text(data)
+                else:
+                    self.result = data
+        except requests.RequestException as e:
+            self.error = e
+        finally:
+            self._finished.set()
@@ -0,0 +1,82 @@
+"""
+Concurrent booking/lookup benchmark for backend/appointments.py.
+
+Starts several worker processes against one SQLite file (as several uvicorn
+workers would) and reports booking and lookup throughput plus slot conflicts.
+
+    python benchmarks/bench_appointments.py --workers 4 --bookings 2000 --lookups 20000
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from appointments import AppointmentStore, SlotTaken  # noqa: E402
+
+DOCTOR = "Dr. Mustafa Badshah"
+
+
+def worker(path, worker_id, bookings, lookups, patients, results):
+    store = AppointmentStore(path)
+    rng = random.Random(worker_id)
+    conflicts = 0
+
+    start = time.perf_counter()
+    for _ in range(bookings):
+        patient = f"patient-{rng.randrange(patients)}"
+        date = f"{rng.randint(1, 28)}/{rng.randint(1, 12)}/2026"
+        slot = f"{rng.randint(9, 17)}:{rng.choice(['00', '30'])}"
+        try:
+            store.book(patient, DOCTOR, date, slot)
+        except SlotTaken:
+            conflicts += 1
+    booking_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(lookups):
+        store.latest(f"patient-{rng.randrange(patients)}")
+    lookup_time = time.perf_counter() - start
+
+    results.put((bookings, booking_time, lookups, lookup_time, conflicts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--bookings", type=int, default=2000, help="bookings per worker")
+    parser.add_argument("--lookups", type=int, default=20000, help="lookups per worker")
+    parser.add_argument("--patients", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "appointments.db")
+        AppointmentStore(path)  # create the schema once up front
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=worker,
+                                         args=(path, i, args.bookings, args.lookups, args.patients, results))
+                 for i in range(args.workers)]
+        start = time.perf_counter()
+        for proc in procs:
+            proc.start()
+        rows = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+        wall = time.perf_counter() - start
+
+    bookings = sum(row[0] for row in rows)
+    lookups = sum(row[2] for row in rows)
+    conflicts = sum(row[4] for row in rows)
+    booking_rate = sum(row[0] / row[1] for row in rows)
+    lookup_rate = sum(row[2] / row[3] for row in rows)
+    print(f"workers={args.workers} wall={wall:.2f}s")
+    print(f"bookings: {bookings} total, {booking_rate:,.0f}/s aggregate, {conflicts} slot conflicts")
+    print(f"lookups:  {lookups} total, {lookup_rate:,.0f}/s aggregate")
+
+
+if __name__ == "__main__":
+    main()
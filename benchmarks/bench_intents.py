@@ -0,0 +1,98 @@
+"""
+Microbenchmark for the intent matcher in backend/intents.py.
+
+Compares the compiled IntentMatcher with the original per-call approach
+(normalize the text again for each keyword list, then `any(kw in norm ...)`),
+first on the shipped keyword tables and then on synthetic tables with
+thousands of phrases. Also checks that both give the same answers, and that
+the incremental scanner finds the same intents however the text is chunked.
+
+    python benchmarks/bench_intents.py
+"""
+import os
+import random
+import re
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from intents import INTENT_KEYWORDS, IntentMatcher  # noqa: E402
+
+SAMPLES = [
+    "I've been feeling really low lately and I don't know why.",
+    "Can you prescribe something for my anxiety? What medicine should I take?",
+    "I want to book an appointment for 12/8/2025 11:00am please",
+    "Everything feels pointless and I can't go on like this, please call me now",
+    "Work has been stressful, my manager keeps piling on deadlines and I barely sleep. "
+    "I used to enjoy running but lately I just sit at home scrolling on my phone all evening.",
+]
+
+
+def legacy_intents(text, keyword_sets):
+    # What parse_response did before: rebuild normalize, rescan per keyword list
+    def normalize(value):
+        return re.sub(r'[^a-z0-9\s]', '', value.lower())
+
+    def contains_keywords(value, keywords):
+        norm = normalize(value)
+        return any(kw in norm for kw in keywords)
+
+    return frozenset(intent for intent, keywords in keyword_sets.items() if contains_keywords(text, keywords))
+
+
+def synthetic_keywords(count, seed=7):
+    rng = random.Random(seed)
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))) for _ in range(4000)]
+    sets = {f"intent_{i}": [] for i in range(8)}
+    for n in range(count):
+        phrase = " ".join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+        sets[f"intent_{n % 8}"].append(phrase)
+    return sets
+
+
+def random_chunks(text, rng):
+    # Split at random points, the way streamed tokens would arrive
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 12))))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+def scanned_intents(matcher, chunks):
+    scanner = matcher.scanner()
+    found = frozenset()
+    for chunk in chunks:
+        found |= scanner.feed(chunk)
+    return found
+
+
+def bench(label, keyword_sets, samples, number):
+    matcher = IntentMatcher(keyword_sets)
+    rng = random.Random(len(samples))
+    for text in samples:
+        assert matcher.intents(text) == legacy_intents(text, keyword_sets), text
+        for _ in range(20):
+            chunks = random_chunks(text, rng)
+            assert scanned_intents(matcher, chunks) == matcher.intents(text), chunks
+
+    legacy = timeit.timeit(lambda: [legacy_intents(t, keyword_sets) for t in samples], number=number)
+    compiled = timeit.timeit(lambda: [matcher.intents(t) for t in samples], number=number)
+    build = timeit.timeit(lambda: IntentMatcher(keyword_sets), number=1)
+    calls = number * len(samples)
+    print(f"{label:<26} {matcher.keyword_count:>7} {legacy / calls * 1e6:>12.2f} {compiled / calls * 1e6:>12.2f} "
+          f"{legacy / compiled:>8.1f}x {build * 1000:>9.1f}")
+
+
+def main():
+    print(f"{'keyword set':<26} {'phrases':>7} {'legacy us':>12} {'matcher us':>12} {'speedup':>9} {'build ms':>9}")
+    bench("shipped tables", INTENT_KEYWORDS, SAMPLES, number=2000)
+    for count in (1000, 5000, 20000):
+        keyword_sets = synthetic_keywords(count)
+        # Plant a few real phrases so the texts actually match something
+        rng = random.Random(count)
+        planted = [text + " " + rng.choice(keyword_sets["intent_3"]) for text in SAMPLES]
+        bench(f"synthetic {count}", keyword_sets, SAMPLES + planted, number=50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Microbenchmark for the chat view in chat_view.py.
+
+Simulates one Streamlit rerun after a new message at growing session lengths:
+the original loop (rebuild every bubble from the raw history, no escaping)
+against window_html (bubbles escaped once and cached, only the newest
+CHAT_WINDOW messages rendered). Reports time per rerun and the size of the
+markup sent to the browser.
+
+    python benchmarks/bench_render.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chat_view import CHAT_WINDOW, window_html  # noqa: E402
+
+USER_TEXT = "I've been feeling on edge at work & can't switch off in the evenings <3"
+DOCTOR_TEXT = ("I can sense how draining that must be. Many people find their mind keeps racing once the day ends. "
+               "What sometimes helps is a short wind-down routine. What does a typical evening look like for you?")
+TOOLS = (None, None, None, "appointment_booking", None, "medication_advice")
+
+
+def make_history(count):
+    history = []
+    for i in range(count):
+        if i % 2 == 0:
+            history.append({"role": "user", "content": f"{USER_TEXT} ({i})"})
+        else:
+            history.append({"role": "assistant", "content": DOCTOR_TEXT, "tool_called": TOOLS[i // 2 % len(TOOLS)]})
+    return history
+
+
+def legacy_html(history):
+    # What frontend.py did on every rerun before
+    chat_html = '<div class="chat-outer" id="chat-outer">'
+    for message in history:
+        if message["role"] == "user":
+            chat_html += f'<div class="chat-bubble user-bubble"><b>You:</b> {message["content"]}</div>'
+        else:
+            tool = message.get("tool_called")
+            if tool == "emergency_call":
+                chat_html += f'<div class="chat-bubble doctor-bubble"><b>Dr. Mustafa Badshah:</b> {message["content"]}<br><span style="color:#e74c3c;font-weight:600;">🚨 Emergency support triggered!</span></div>'
+            elif tool == "medication_advice":
+                chat_html += f'<div class="chat-bubble doctor-bubble"><b>Dr. Mustafa Badshah:</b> {message["content"]}<br><span style="color:#2980b9;font-weight:600;">💊 Medication advice provided</span></div>'
+            elif tool == "appointment_booking":
+                chat_html += f'<div class="chat-bubble doctor-bubble"><b>Dr. Mustafa Badshah:</b> {message["content"]}<br><span style="color:#27ae60;font-weight:600;">📅 Appointment booking started</span></div>'
+            else:
+                chat_html += f'<div class="chat-bubble doctor-bubble"><b>Dr. Mustafa Badshah:</b> {message["content"]}</div>'
+    chat_html += '</div>'
+    return chat_html
+
+
+def bench(count, number):
+    history = make_history(count)
+    window_html(history)  # earlier reruns have already rendered and cached these bubbles
+
+    def rerun_windowed():
+        # A new message arrives, then the script reruns top to bottom
+        history.append({"role": "user", "content": USER_TEXT})
+        window_html(history)
+        history.pop()
+
+    def rerun_legacy():
+        history.append({"role": "user", "content": USER_TEXT})
+        legacy_html(history)
+        history.pop()
+
+    legacy = timeit.timeit(rerun_legacy, number=number) / number
+    windowed = timeit.timeit(rerun_windowed, number=number) / number
+    print(f"{count:>9} {legacy * 1e6:>12.1f} {windowed * 1e6:>12.1f} {legacy / windowed:>8.1f}x "
+          f"{len(legacy_html(history)) / 1024:>11.1f} {len(window_html(history)) / 1024:>11.1f}")
+
+
+def main():
+    print(f"window = {CHAT_WINDOW} messages")
+    print(f"{'messages':>9} {'legacy us':>12} {'window us':>12} {'speedup':>9} {'legacy KiB':>11} {'window KiB':>11}")
+    for count in (10, 100, 1000, 5000, 20000):
+        bench(count, number=max(20, 20000 // count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Cold-start benchmark for the backend.
+
+1. Import-time breakdown: runs `python -X importtime -c "import main"` in
+   backend/ and reports total import time, the heaviest top-level packages
+   (self time summed over all their submodules) and the project's own modules.
+2. Time to ready: launches the backend under uvicorn against the fake
+   Groq/Twilio server, with and without the startup pre-warm, and measures
+   how long until it answers and how long its first model turn takes.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 5 --top 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(HERE, "..", "backend")
+sys.path.insert(0, HERE)
+
+from fake_upstream import FakeSettings, FakeUpstream  # noqa: E402
+from run_bench import FAKE_CONFIG, free_port, start_backend  # noqa: E402
+
+PROJECT_MODULES = {os.path.splitext(name)[0] for name in os.listdir(BACKEND_DIR) if name.endswith(".py")}
+
+
+def import_times(tmp):
+    """One fresh interpreter importing main; returns {module: (self_us, cumulative_us)}."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [tmp, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def import_breakdown(tmp, repeat, top):
+    runs = [import_times(tmp) for _ in range(repeat)]
+    totals = [run["main"][1] for run in runs]
+    print(f"import main: median {statistics.median(totals) / 1000:.1f}ms "
+          f"(min {min(totals) / 1000:.1f}ms, max {max(totals) / 1000:.1f}ms, {repeat} runs)")
+
+    packages = defaultdict(list)
+    for run in runs:
+        per_package = defaultdict(int)
+        for name, (self_us, _) in run.items():
+            per_package[name.split(".")[0]] += self_us
+        for package, self_us in per_package.items():
+            packages[package].append(self_us)
+    ranked = sorted(((statistics.median(values), package) for package, values in packages.items()), reverse=True)
+    print("\nheaviest packages (self time of all submodules, median):")
+    for self_us, package in ranked[:top]:
+        print(f"  {package:<28} {self_us / 1000:>8.1f}ms")
+
+    print("\nproject modules (cumulative, median):")
+    for name in sorted(PROJECT_MODULES & set(runs[0])):
+        print(f"  {name:<28} {statistics.median(run[name][1] for run in runs if name in run) / 1000:>8.1f}ms")
+    lazy = [name for name in ("groq", "twilio", "httpx") if name not in runs[0]]
+    if lazy:
+        print(f"\nnot imported at startup: {', '.join(lazy)}")
+
+
+def time_to_ready(tmp, upstream, prewarm_connections, timeout=30.0):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = start_backend(tmp, port, 1, upstream.url, {"GROQ_PREWARM_CONNECTIONS": str(prewarm_connections),
+                                                      "EMERGENCY_CALLS_ENABLED": "0"})
+    try:
+        while True:
+            if proc.poll() is not None or time.perf_counter() - started > timeout:
+                raise RuntimeError("backend did not start")
+            try:
+                if httpx.get(url + "/stats/cache", timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.02)
+        ready = time.perf_counter() - started
+        began = time.perf_counter()
+        httpx.post(url + "/ask", json={"message": "I keep overthinking everything lately"}, timeout=timeout)
+        first_turn = time.perf_counter() - began
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return ready, first_turn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=12, help="packages to list")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake upstream first-token latency (s)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "config.py"), "w") as handle:
+            handle.write(FAKE_CONFIG)
+        import_breakdown(tmp, args.repeat, args.top)
+
+        upstream = FakeUpstream(FakeSettings(latency=args.latency, tokens=20)).start()
+        try:
+            print("\nstartup against the fake upstream (median):")
+            for label, connections in (("no pre-warm", 0), ("pre-warm", 4)):
+                samples = [time_to_ready(tmp, upstream, connections) for _ in range(args.repeat)]
+                ready = statistics.median(s[0] for s in samples)
+                first = statistics.median(s[1] for s in samples)
+                print(f"  {label:<12} ready after {ready * 1000:>7.1f}ms, first model turn {first * 1000:>7.1f}ms")
+        finally:
+            upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Local stand-in for the Groq chat-completions API and the Twilio calls API.
+
+Lets the backend run without network access or real keys. Latency, token
+rate, error rate and streaming can be tuned per run:
+
+    python benchmarks/fake_upstream.py --port 9100 --latency 0.25 --token-rate 300 --error-rate 0.01
+
+Point the backend at it with GROQ_BASE_URL=http://127.0.0.1:9100 (the Groq SDK
+reads this variable) and TWILIO_BASE_URL=http://127.0.0.1:9100.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("I can sense how difficult this must be for you and many people feel this way when things pile up "
+         "what sometimes helps is taking a small step at a time I notice how you are reaching out which takes "
+         "courage could you tell me a little more about when these feelings started").split()
+
+
+@dataclass
+class FakeSettings:
+    latency: float = 0.2        # seconds before the first token (or the whole body when not streaming)
+    token_rate: float = 200.0   # tokens per second once generation starts
+    tokens: int = 120           # completion length
+    error_rate: float = 0.0     # fraction of completions answered with HTTP 500
+    chunk_tokens: int = 1       # tokens per streamed SSE event
+    twilio_latency: float = 0.1
+    reply: str = ""             # completion text (words are repeated to fill `tokens`); default is a generic reply
+
+
+class FakeUpstream:
+    """Threaded HTTP server implementing just enough of both APIs for the backend."""
+
+    def __init__(self, settings: FakeSettings, host: str = "127.0.0.1", port: int = 0):
+        self.settings = settings
+        self.counters = {"completions": 0, "streams": 0, "errors": 0, "calls": 0, "models": 0}
+        self._lock = threading.Lock()
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    with upstream._lock:
+                        self._json(200, dict(upstream.counters))
+                elif self.path.endswith("/models"):
+                    # Used by the backend's startup pre-warm
+                    upstream._count("models")
+                    self._json(200, {"object": "list", "data": [{"id": "llama3-70b-8192", "object": "model",
+                                                                 "created": 0, "owned_by": "fake"}]})
+                else:
+                    self._json(404, {"error": "not found"})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("content-length", 0)))
+                if self.path.endswith("/chat/completions"):
+                    upstream._completion(self, json.loads(body or b"{}"))
+                elif re.search(r"/Accounts/[^/]+/Calls\.json$", self.path):
+                    upstream._call(self)
+                else:
+                    self._json(404, {"error": "not found"})
+
+            def _json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def _completion(self, handler, request):
+        settings = self.settings
+        self._count("completions")
+        if random.random() < settings.error_rate:
+            self._count("errors")
+            time.sleep(settings.latency)
+            handler._json(500, {"error": {"message": "fake upstream error", "type": "internal_server_error"}})
+            return
+
+        count = min(settings.tokens, int(request.get("max_tokens") or settings.tokens))
+        words = settings.reply.split() or WORDS
+        tokens = [words[i % len(words)] + " " for i in range(count)]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "fake")
+        usage = {"prompt_tokens": sum(len(m.get("content", "")) // 4 + 1 for m in request.get("messages", [])),
+                 "completion_tokens": count}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        time.sleep(settings.latency)
+
+        if request.get("stream"):
+            self._count("streams")
+            handler.send_response(200)
+            handler.send_header("content-type", "text/event-stream")
+            handler.send_header("transfer-encoding", "chunked")
+            handler.end_headers()
+            try:
+                step = max(1, settings.chunk_tokens)
+                for start in range(0, len(tokens), step):
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model,
+                             "choices": [{"index": 0, "delta": {"content": "".join(tokens[start:start + step])},
+                                          "finish_reason": None}]}
+                    if start + step >= len(tokens):
+                        chunk["choices"][0]["finish_reason"] = "stop"
+                        chunk["x_groq"] = {"id": completion_id, "usage": usage}
+                    self._write_chunk(handler, f"data: {json.dumps(chunk)}\n\n")
+                    if settings.token_rate > 0:
+                        time.sleep(step / settings.token_rate)
+                self._write_chunk(handler, "data: [DONE]\n\n")
+                handler.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client cancelled the stream
+                handler.close_connection = True
+            return
+
+        if settings.token_rate > 0:
+            time.sleep(count / settings.token_rate)
+        handler._json(200, {
+            "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "".join(tokens).strip()}}],
+            "usage": usage,
+        })
+
+    @staticmethod
+    def _write_chunk(handler, text):
+        data = text.encode()
+        handler.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        handler.wfile.flush()
+
+    def _call(self, handler):
+        self._count("calls")
+        time.sleep(self.settings.twilio_latency)
+        handler._json(201, {"sid": "CA" + uuid.uuid4().hex, "status": "queued"})
+
+    def start(self) -> "FakeUpstream":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=FakeSettings.latency)
+    parser.add_argument("--token-rate", type=float, default=FakeSettings.token_rate)
+    parser.add_argument("--tokens", type=int, default=FakeSettings.tokens)
+    parser.add_argument("--error-rate", type=float, default=FakeSettings.error_rate)
+    parser.add_argument("--chunk-tokens", type=int, default=FakeSettings.chunk_tokens,
+                        help="tokens per streamed event")
+    parser.add_argument("--reply", default=FakeSettings.reply, help="completion text to stream back")
+    args = parser.parse_args()
+
+    settings = FakeSettings(latency=args.latency, token_rate=args.token_rate, tokens=args.tokens,
+                            error_rate=args.error_rate, chunk_tokens=args.chunk_tokens, reply=args.reply)
+    upstream = FakeUpstream(settings, args.host, args.port)
+    print(f"fake Groq/Twilio listening on {upstream.url}")
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
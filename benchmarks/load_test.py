@@ -0,0 +1,78 @@
+"""
+Load test for the /ask endpoint.
+
+Fires requests at a running backend with increasing concurrency and prints
+p50/p99 latency and throughput for each level, e.g.:
+
+    RATE_LIMIT_ENABLED=0 uvicorn main:app --port 8000   # from backend/; every request comes from one address
+    python benchmarks/load_test.py --levels 1,8,32,128,256 --requests 512
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+DEFAULT_MESSAGES = [
+    "I've been feeling really low lately and I don't know why.",
+    "Work has been stressful and I can't sleep well.",
+    "How do I stop overthinking everything?",
+    "I had an argument with my sister and feel awful.",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_level(client, url, concurrency, total, messages):
+    latencies = []
+    statuses = Counter()
+    sent = 0
+
+    async def worker():
+        nonlocal sent
+        while sent < total:
+            message = messages[sent % len(messages)]
+            sent += 1
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json={"message": message})
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return latencies, statuses, elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/ask")
+    parser.add_argument("--levels", default="1,8,32,128,256", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=256, help="requests per level")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        print(f"{'conc':>6} {'reqs':>6} {'rps':>8} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}  statuses")
+        for level in levels:
+            latencies, statuses, elapsed = await run_level(client, args.url, level, args.requests, DEFAULT_MESSAGES)
+            ms = [value * 1000 for value in latencies]
+            print(f"{level:>6} {len(ms):>6} {len(ms) / elapsed:>8.1f} {percentile(ms, 50):>9.1f} "
+                  f"{percentile(ms, 99):>9.1f} {statistics.fmean(ms):>9.1f}  {dict(statuses)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,170 @@
+"""
+Load test for upstream priority scheduling.
+
+Saturates the backend with routine conversations while a handful of crisis
+conversations keep talking: each one opens with a distress message (answered
+by the emergency tool) and then sends follow-ups that need the model. Runs the
+scenario once with priority scheduling and once with plain FIFO, and reports
+crisis follow-up latency against an idle baseline, plus the background latency
+and how much background traffic was shed.
+
+    python benchmarks/priority_load_test.py
+    python benchmarks/priority_load_test.py --background 96 --duration 20 --max-concurrency 8
+
+Uses the fake Groq/Twilio server, so no network access or keys are needed.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from fake_upstream import FakeSettings, FakeUpstream  # noqa: E402
+from run_bench import free_port, percentile, run_turn, start_backend, wait_ready  # noqa: E402
+
+BACKGROUND_MESSAGES = [
+    "I have been thinking about changing jobs and I am not sure how to decide",
+    "My sister and I keep arguing about small things lately",
+    "How do I get better at sticking to a morning routine",
+    "I find it hard to relax on the weekends",
+]
+CRISIS_OPENING = "I think I am having a panic attack"
+CRISIS_FOLLOW_UPS = [
+    "It is still happening, what should I do right now",
+    "Okay I am sitting down now. Can you stay with me for a minute",
+    "It feels a little better but I keep thinking it will come back",
+]
+
+
+async def background_traffic(url, stop_at, concurrency, timeout):
+    """Routine single-turn conversations, as fast as the service will take them."""
+    latencies, routes = [], {}
+    counter = itertools.count()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def worker(client):
+        while time.monotonic() < stop_at:
+            n = next(counter)
+            # A unique suffix keeps the response cache out of the picture
+            message = f"{BACKGROUND_MESSAGES[n % len(BACKGROUND_MESSAGES)]} {n}"
+            try:
+                result, marks = await run_turn(client, url, message, None)
+            except httpx.HTTPError as e:
+                routes[type(e).__name__] = routes.get(type(e).__name__, 0) + 1
+                continue
+            route = result.get("route")
+            routes[route] = routes.get(route, 0) + 1
+            if route == "busy":
+                await asyncio.sleep(0.05)  # what a client honouring Retry-After would roughly do
+            else:
+                latencies.append((marks["done"] - marks["start"]) * 1000)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return latencies, routes
+
+
+async def crisis_conversations(url, conversations, interval, timeout):
+    """Crisis sessions sending model-bound follow-ups; returns follow-up latencies and routes."""
+    latencies, routes = [], {}
+
+    async def conversation(client, index):
+        await asyncio.sleep(index * interval / max(1, conversations))
+        result, _ = await run_turn(client, url, CRISIS_OPENING, None)
+        session_id = result.get("session_id")
+        for message in CRISIS_FOLLOW_UPS:
+            await asyncio.sleep(interval)
+            result, marks = await run_turn(client, url, message, session_id)
+            route = result.get("route")
+            routes[route] = routes.get(route, 0) + 1
+            if route == "llm":
+                latencies.append((marks["done"] - marks["start"]) * 1000)
+
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        await asyncio.gather(*(conversation(client, i) for i in range(conversations)))
+    return latencies, routes
+
+
+async def scenario(url, args, with_background):
+    if not with_background:
+        return await crisis_conversations(url, args.crisis, args.interval, args.timeout), ([], {})
+    stop_at = time.monotonic() + args.duration
+    background = asyncio.ensure_future(background_traffic(url, stop_at, args.background, args.timeout))
+    await asyncio.sleep(args.warmup)  # let the queue fill up first
+    crisis = await crisis_conversations(url, args.crisis, args.interval, args.timeout)
+    return crisis, await background
+
+
+def run_mode(args, upstream, prioritize):
+    env = {
+        "GROQ_PRIORITY_SCHEDULING": "1" if prioritize else "0",
+        "GROQ_MAX_CONCURRENCY": str(args.max_concurrency),
+        "GROQ_MAX_QUEUE": str(args.max_queue),
+        "GROQ_RESERVED_SLOTS": str(args.reserved),
+        "EMERGENCY_CALLS_ENABLED": "0",
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        proc = start_backend(tmp, port, 1, upstream.url, env)
+        url = f"http://127.0.0.1:{port}"
+        try:
+            wait_ready(url, proc)
+            for phase, with_background in (("idle", False), ("loaded", True)):
+                (crisis, crisis_routes), (background, background_routes) = asyncio.run(
+                    scenario(url, args, with_background))
+                results[phase] = {"crisis": crisis, "crisis_routes": crisis_routes,
+                                  "background": background, "background_routes": background_routes}
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+    return results
+
+
+def line(label, values):
+    if not values:
+        return f"  {label:<22} n=0"
+    return (f"  {label:<22} n={len(values):<5} p50={percentile(values, 50):>8.1f}ms "
+            f"p95={percentile(values, 95):>8.1f}ms max={max(values):>8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--background", type=int, default=64, help="concurrent background conversations")
+    parser.add_argument("--crisis", type=int, default=4, help="concurrent crisis conversations")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between crisis follow-ups")
+    parser.add_argument("--duration", type=float, default=12.0, help="seconds of background load")
+    parser.add_argument("--warmup", type=float, default=2.0, help="background-only seconds before crisis turns")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="GROQ_MAX_CONCURRENCY for the backend")
+    parser.add_argument("--max-queue", type=int, default=32, help="GROQ_MAX_QUEUE for the backend")
+    parser.add_argument("--reserved", type=int, default=2, help="GROQ_RESERVED_SLOTS for the backend")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake upstream first-token latency (s)")
+    parser.add_argument("--token-rate", type=float, default=FakeSettings.token_rate)
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(FakeSettings(latency=args.latency, token_rate=args.token_rate,
+                                         tokens=args.tokens, chunk_tokens=4)).start()
+    try:
+        for name, prioritize in (("priority", True), ("fifo", False)):
+            results = run_mode(args, upstream, prioritize)
+            print(f"{name}:")
+            print(line("crisis (idle)", results["idle"]["crisis"]))
+            print(line("crisis (loaded)", results["loaded"]["crisis"]))
+            print(line("background (loaded)", results["loaded"]["background"]))
+            print(f"  crisis routes     {results['loaded']['crisis_routes']}")
+            print(f"  background routes {results['loaded']['background_routes']}")
+    finally:
+        upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Offline end-to-end benchmark for the backend.
+
+Starts a fake Groq/Twilio server (benchmarks/fake_upstream.py), launches
+backend/main.py under uvicorn pointed at it, replays a conversation workload
+through /ask/stream and reports throughput, latency percentiles,
+time-to-first-token and a per-stage breakdown. No network access or real
+keys are needed.
+
+    python benchmarks/run_bench.py --concurrency 32 --repeat 5
+    python benchmarks/run_bench.py --save baseline.json
+    python benchmarks/run_bench.py --compare baseline.json --tolerance 0.15   # exits 1 on regression
+
+Workloads are JSONL files with one conversation per line: {"turns": ["...", "..."]}.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(HERE, "..", "backend")
+sys.path.insert(0, HERE)
+
+from fake_upstream import FakeSettings, FakeUpstream  # noqa: E402
+
+FAKE_CONFIG = """GROQ_API_KEY = "bench-key"
+TWILIO_ACCOUNT_SID = "ACbench"
+TWILIO_AUTH_TOKEN = "bench-token"
+TWILIO_FROM_NUMBER = "+15550000000"
+EMERGENCY_CONTACT = "+15550000001"
+"""
+
+# Lower is better for every metric except throughput
+COMPARED = {"latency_p95_ms": "lower", "latency_p99_ms": "lower", "ttft_p95_ms": "lower", "throughput_rps": "higher"}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def load_workload(path):
+    with open(path) as handle:
+        return [json.loads(line)["turns"] for line in handle if line.strip()]
+
+
+def start_backend(tmp, port, workers, upstream_url, extra_env):
+    with open(os.path.join(tmp, "config.py"), "w") as handle:
+        handle.write(FAKE_CONFIG)
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [tmp, env.get("PYTHONPATH")])),
+        "GROQ_BASE_URL": upstream_url,
+        "TWILIO_BASE_URL": upstream_url,
+        "APPOINTMENTS_DB": os.path.join(tmp, "appointments.db"),
+        "EMERGENCY_CALLS_ENABLED": "1",  # calls go to the fake Twilio endpoint
+        # Every simulated patient comes from 127.0.0.1, which the per-client limits would throttle
+        "RATE_LIMIT_ENABLED": "0",
+    })
+    env.update(extra_env)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+def wait_ready(url, proc, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError("backend exited during startup")
+        try:
+            if httpx.get(url + "/stats/cache", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("backend did not become ready")
+
+
+async def run_turn(client, url, message, session_id):
+    """One /ask/stream call, timing each stage as seen by the client."""
+    marks = {"start": time.perf_counter()}
+    result = {"route": "http_error", "session_id": session_id}
+    async with client.stream("POST", url + "/ask/stream", json={"message": message, "session_id": session_id}) as response:
+        marks["headers"] = time.perf_counter()
+        if response.status_code != 200:
+            result["route"] = f"http_{response.status_code}"
+        else:
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:") and event == "token":
+                    marks.setdefault("first_token", time.perf_counter())
+                    marks["last_token"] = time.perf_counter()
+                elif line.startswith("data:") and event == "done":
+                    result = json.loads(line[5:])
+    marks["done"] = time.perf_counter()
+    marks.setdefault("first_token", marks["done"])
+    marks.setdefault("last_token", marks["first_token"])
+    return result, marks
+
+
+async def replay(url, conversations, concurrency, timeout):
+    samples = []
+    queue = asyncio.Queue()
+    for turns in conversations:
+        queue.put_nowait(turns)
+
+    async def worker(client):
+        while not queue.empty():
+            turns = queue.get_nowait()
+            session_id = None
+            for message in turns:
+                try:
+                    result, marks = await run_turn(client, url, message, session_id)
+                except httpx.HTTPError as e:
+                    samples.append({"route": type(e).__name__, "marks": None})
+                    break
+                session_id = result.get("session_id", session_id)
+                samples.append({"route": result.get("route"), "marks": marks})
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return samples, elapsed
+
+
+def server_stages(url):
+    """Mean time per pipeline stage from the backend's /metrics (one worker's view when --workers > 1)."""
+    try:
+        text = httpx.get(url + "/metrics", timeout=5.0).text
+    except httpx.HTTPError:
+        return {}
+    sums, counts = {}, {}
+    for match in re.finditer(r'^ask_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$', text, re.MULTILINE):
+        kind, stage, value = match.groups()
+        (sums if kind == "sum" else counts)[stage] = float(value)
+    return {stage: {"mean_ms": sums[stage] / counts[stage] * 1000, "count": int(counts[stage])}
+            for stage in sums if counts.get(stage)}
+
+
+def summarize(samples, elapsed):
+    timed = [s for s in samples if s["marks"]]
+    ms = lambda a, b: [(s["marks"][b] - s["marks"][a]) * 1000 for s in timed]  # noqa: E731
+    latency = ms("start", "done")
+    ttft = ms("start", "first_token")
+    summary = {
+        "turns": len(samples),
+        "errors": sum(1 for s in samples if s["route"] in (None, "error", "busy") or not s["marks"]
+                      or str(s["route"]).startswith("http")),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_p50_ms": percentile(latency, 50), "latency_p95_ms": percentile(latency, 95),
+        "latency_p99_ms": percentile(latency, 99),
+        "ttft_p50_ms": percentile(ttft, 50), "ttft_p95_ms": percentile(ttft, 95), "ttft_p99_ms": percentile(ttft, 99),
+        "stages": {},
+        "routes": {},
+    }
+    for name, (a, b) in {"response_headers": ("start", "headers"), "first_token": ("headers", "first_token"),
+                         "generation": ("first_token", "last_token"), "finalize": ("last_token", "done")}.items():
+        values = ms(a, b)
+        summary["stages"][name] = {"mean_ms": sum(values) / len(values) if values else 0.0,
+                                   "p95_ms": percentile(values, 95)}
+    by_route = defaultdict(list)
+    for s in timed:
+        by_route[s["route"]].append((s["marks"]["done"] - s["marks"]["start"]) * 1000)
+    for route, values in sorted(by_route.items(), key=lambda item: str(item[0])):
+        summary["routes"][str(route)] = {"count": len(values), "p50_ms": percentile(values, 50),
+                                         "p95_ms": percentile(values, 95)}
+    return summary
+
+
+def report(summary):
+    print(f"turns={summary['turns']} errors={summary['errors']} elapsed={summary['elapsed_s']}s "
+          f"throughput={summary['throughput_rps']} turns/s")
+    print(f"latency  p50={summary['latency_p50_ms']:.1f}ms p95={summary['latency_p95_ms']:.1f}ms "
+          f"p99={summary['latency_p99_ms']:.1f}ms")
+    print(f"ttft     p50={summary['ttft_p50_ms']:.1f}ms p95={summary['ttft_p95_ms']:.1f}ms "
+          f"p99={summary['ttft_p99_ms']:.1f}ms")
+    print("stages (client side):")
+    for name, stage in summary["stages"].items():
+        print(f"  {name:<17} mean={stage['mean_ms']:>8.1f}ms p95={stage['p95_ms']:>8.1f}ms")
+    if summary.get("server_stages"):
+        print("stages (server side, from /metrics):")
+        for name, stage in summary["server_stages"].items():
+            print(f"  {name:<17} mean={stage['mean_ms']:>8.2f}ms n={stage['count']}")
+    print("routes:")
+    for route, stats in summary["routes"].items():
+        print(f"  {route:<10} n={stats['count']:<5} p50={stats['p50_ms']:>8.1f}ms p95={stats['p95_ms']:>8.1f}ms")
+
+
+def compare(summary, baseline, tolerance):
+    regressions = []
+    for metric, better in COMPARED.items():
+        old, new = baseline.get(metric), summary.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = change > tolerance if better == "lower" else -change > tolerance
+        print(f"  {metric:<16} baseline={old:>9.1f} now={new:>9.1f} ({change:+.1%}){'  REGRESSION' if worse else ''}")
+        if worse:
+            regressions.append(metric)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", default=os.path.join(HERE, "workloads", "therapy.jsonl"))
+    parser.add_argument("--repeat", type=int, default=3, help="times to replay the workload")
+    parser.add_argument("--concurrency", type=int, default=16, help="conversations in flight")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--backend-url", help="benchmark an already running backend instead of starting one")
+    parser.add_argument("--latency", type=float, default=FakeSettings.latency, help="fake upstream first-token latency (s)")
+    parser.add_argument("--token-rate", type=float, default=FakeSettings.token_rate, help="fake upstream tokens/s")
+    parser.add_argument("--tokens", type=int, default=FakeSettings.tokens, help="fake completion length")
+    parser.add_argument("--error-rate", type=float, default=FakeSettings.error_rate)
+    parser.add_argument("--chunk-tokens", type=int, default=FakeSettings.chunk_tokens)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the backend (repeatable)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--save", help="write the summary as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args()
+
+    conversations = load_workload(args.workload) * args.repeat
+    settings = FakeSettings(latency=args.latency, token_rate=args.token_rate, tokens=args.tokens,
+                            error_rate=args.error_rate, chunk_tokens=args.chunk_tokens)
+    upstream = FakeUpstream(settings).start()
+    proc = None
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            url = args.backend_url
+            if url is None:
+                port = free_port()
+                extra_env = dict(item.split("=", 1) for item in args.env)
+                proc = start_backend(tmp, port, args.workers, upstream.url, extra_env)
+                url = f"http://127.0.0.1:{port}"
+            wait_ready(url, proc)
+            samples, elapsed = asyncio.run(replay(url, conversations, args.concurrency, args.timeout))
+            summary = summarize(samples, elapsed)
+            summary["server_stages"] = server_stages(url)
+            summary["upstream"] = dict(upstream.counters)
+            summary["settings"] = vars(args)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        upstream.stop()
+
+    report(summary)
+    print(f"upstream: {summary['upstream']}")
+    if args.save:
+        with open(args.save, "w") as handle:
+            json.dump(summary, handle, indent=2)
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+        print("compared with baseline:")
+        if compare(summary, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
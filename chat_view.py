@@ -0,0 +1,55 @@
+import html
+import os
+from typing import List
+
+# Chat rendering settings (override with environment variables)
+CHAT_WINDOW = int(os.getenv("CHAT_WINDOW", "50"))        # messages shown by default
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "50"))  # extra messages per "show earlier" click
+
+DOCTOR_LABEL = "<b>Dr. Mustafa Badshah:</b> "
+TOOL_BADGES = {
+    "emergency_call": '<br><span style="color:#e74c3c;font-weight:600;">🚨 Emergency support triggered!</span>',
+    "medication_advice": '<br><span style="color:#2980b9;font-weight:600;">💊 Medication advice provided</span>',
+    "appointment_booking": '<br><span style="color:#27ae60;font-weight:600;">📅 Appointment booking started</span>',
+}
+
+
+def escape_text(text: str) -> str:
+    # Newlines become <br> so a blank line in a reply can't end the surrounding HTML block
+    return html.escape(text).replace("\n", "<br>")
+
+
+def bubble_html(message: dict) -> str:
+    """
+    The chat bubble for one message. Rendered (and escaped) once, then kept on the
+    message itself so later reruns only join strings.
+    """
+    cached = message.get("html")
+    if cached is None:
+        content = escape_text(message["content"])
+        if message["role"] == "user":
+            cached = f'<div class="chat-bubble user-bubble"><b>You:</b> {content}</div>'
+        else:
+            badge = TOOL_BADGES.get(message.get("tool_called"), "")
+            cached = f'<div class="chat-bubble doctor-bubble">{DOCTOR_LABEL}{content}{badge}</div>'
+        message["html"] = cached
+    return cached
+
+
+def streaming_html(escaped_partial: str) -> str:
+    """
+    Bubble for a reply that is still arriving. The caller escapes each token once as it
+    comes in (see ReplyJob.escaped_text); escaping works per character, so the pieces join up.
+    """
+    return f'<div class="chat-bubble doctor-bubble">{DOCTOR_LABEL}{escaped_partial}▌</div>'
+
+
+def hidden_count(history: List[dict], visible: int) -> int:
+    return max(0, len(history) - visible)
+
+
+def window_html(history: List[dict], visible: int = CHAT_WINDOW) -> str:
+    """The chat container with only the newest `visible` messages, so its size doesn't grow with the session."""
+    start = hidden_count(history, visible)
+    bubbles = "".join(bubble_html(message) for message in history[start:])
+    return f'<div class="chat-outer" id="chat-outer">{bubbles}</div>'
@@ -2,8 +2,13 @@ import streamlit as st
 import requests
 import streamlit.components.v1 as components
 
+from backend_client import BackendClient, ReplyJob
+from chat_view import CHAT_PAGE_SIZE, CHAT_WINDOW, hidden_count, streaming_html, window_html
+
 st.set_page_config(page_title="AI Doctor ChatBot Therapist", page_icon="🩺", layout="centered")
 
+REPLY_POLL_INTERVAL = 0.2  # seconds between checks on a reply that is streaming in
+
 
 # --- CSS Styling ---
 st.markdown("""
@@ -143,27 +148,67 @@ st.markdown("""
 # --- Session State ---
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "session_id" not in st.session_state:
+    # Assigned by the backend on the first reply; keys the server-side conversation memory
+    st.session_state.session_id = None
+
+
+
+if "visible_messages" not in st.session_state:
+    st.session_state.visible_messages = CHAT_WINDOW
+
 
+def show_earlier():
+    st.session_state.visible_messages += CHAT_PAGE_SIZE
 
 
 # --- Display Chat (scrollable, input always at bottom, tool UI) ---
-chat_html = '<div class="chat-outer" id="chat-outer">'
-for i, message in enumerate(st.session_state.chat_history):
-    if message["role"] == "user":
-        chat_html += f'<div class="chat-bubble user-bubble"><b>You:</b> {message["content"]}</div>'
+# Only the newest messages are rendered; each bubble is escaped once and cached on its message
+hidden = hidden_count(st.session_state.chat_history, st.session_state.visible_messages)
+if hidden:
+    st.button(f"Show earlier messages ({hidden} hidden)", on_click=show_earlier)
+st.markdown(window_html(st.session_state.chat_history, st.session_state.visible_messages), unsafe_allow_html=True)
+
+
+@st.cache_resource
+def get_backend_client():
+    # One pooled client per Streamlit server process, shared by every browser session
+    return BackendClient()
+
+
+def show_reply(job):
+    if job.result is not None:
+        st.session_state.session_id = job.result.get("session_id", st.session_state.session_id)
+        reply = {"role": "assistant", "content": job.result.get("response", "No response."),
+                 "tool_called": job.result.get("tool_called", None)}
+    elif job.error is None or isinstance(job.error, requests.exceptions.HTTPError):
+        reply = {"role": "assistant", "content": "Server error. Please try again."}
     else:
-        # Check for tool trigger in the next message (if present)
-        tool = message.get("tool_called")
-        if tool == "emergency_call":
-            chat_html += f'<div class="chat-bubble doctor-bubble"><b>Dr. Mustafa Badshah:</b> {message["content"]}<br><span style="color:#e74c3c;font-weight:600;">🚨 Emergency support triggered!</span></div>'
-        elif tool == "medication_advice":
-            chat_html += f'<div class="chat-bubble doctor-bubble"><b>Dr. Mustafa Badshah:</b> {message["content"]}<br><span style="color:#2980b9;font-weight:600;">💊 Medication advice provided</span></div>'
-        elif tool == "appointment_booking":
-            chat_html += f'<div class="chat-bubble doctor-bubble"><b>Dr. Mustafa Badshah:</b> {message["content"]}<br><span style="color:#27ae60;font-weight:600;">📅 Appointment booking started</span></div>'
-        else:
-            chat_html += f'<div class="chat-bubble doctor-bubble"><b>Dr. Mustafa Badshah:</b> {message["content"]}</div>'
-chat_html += '</div>'
-st.markdown(chat_html, unsafe_allow_html=True)
+        reply = {"role": "assistant", "content": "Unable to connect to the backend."}
+    st.session_state.chat_history.append(reply)
+
+
+@st.fragment(run_every=REPLY_POLL_INTERVAL)
+def pending_reply():
+    """
+    Shows the reply that is streaming in on a background thread. Only this fragment
+    reruns while waiting; the whole page reruns once, when the reply is complete.
+    """
+    job = st.session_state.get("reply_job")
+    if job is None:
+        return
+    if not job.finished:
+        partial = job.escaped_text if job.escaped_text else '<i style="color:#7a8a9a;">typing…</i>'
+        st.markdown(streaming_html(partial), unsafe_allow_html=True)
+        return
+    st.session_state.reply_job = None
+    show_reply(job)
+    st.rerun()
+
+
+# Reply that is currently streaming in (polled, so the page stays responsive)
+if st.session_state.get("reply_job") is not None:
+    pending_reply()
 
 
 # --- Improved Input Row (fixed at bottom, clears after send, Enter to send) ---
@@ -174,40 +219,22 @@ if "user_input" not in st.session_state:
 
 def send_message():
     user_input = st.session_state.user_input.strip()
-    if user_input:
+    if user_input and st.session_state.get("reply_job") is None:
         st.session_state.chat_history.append({"role": "user", "content": user_input})
         st.session_state.user_input = ""
-        try:
-            response = requests.post(
-                "http://localhost:8000/ask",
-                json={"message": user_input},
-                timeout=15
-            )
-            if response.status_code == 200:
-                data = response.json()
-                assistant_response = data.get("response", "No response.")
-                tool_called = data.get("tool_called", None)
-                st.session_state.chat_history.append({
-                    "role": "assistant",
-                    "content": assistant_response,
-                    "tool_called": tool_called
-                })
-            else:
-                st.session_state.chat_history.append({"role": "assistant", "content": "Server error. Please try again."})
-        except requests.exceptions.RequestException:
-            st.session_state.chat_history.append({"role": "assistant", "content": "Unable to connect to the backend."})
+        st.session_state.reply_job = ReplyJob(get_backend_client(), user_input, st.session_state.session_id)
+
 
+waiting = st.session_state.get("reply_job") is not None
 st.markdown('<div class="input-row">', unsafe_allow_html=True)
 user_input = st.text_input(
     "How can I help you today?",
     key="user_input",
-    placeholder="Type your message here...",
+    placeholder="Dr. Mustafa Badshah is replying..." if waiting else "Type your message here...",
     value=st.session_state.user_input,
     on_change=send_message
 )
-send_clicked = st.button("Send")
-if send_clicked:
-    send_message()
+st.button("Send", on_click=send_message, disabled=waiting)
 st.markdown('</div>', unsafe_allow_html=True)
 
 # --- Auto Scroll JS ---
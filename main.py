@@ -1,5 +1,109 @@
+"""
+Command line entry point.
+
+    python main.py batch messages.jsonl -o results.jsonl --parallelism 16
+    python main.py batch messages.jsonl --url http://localhost:8000   # use a running backend's /batch
+
+Input is JSONL with one {"message": "..."} or {"turns": ["...", ...]} per line
+(an optional "id" is echoed back). Results are written as JSONL, one line per
+turn, as soon as each is ready; a summary goes to stderr.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+
+def run_local(lines, parallelism, dry_run):
+    """Yield result rows from an in-process pipeline (needs backend/config.py, like the server)."""
+    sys.path.insert(0, BACKEND_DIR)
+    from batch import run_batch
+    from escalation import dispatcher
+    from llm_client import aclose
+
+    async def produce():
+        try:
+            async for row in run_batch(lines, parallelism, dry_run):
+                yield row
+        finally:
+            await aclose()
+
+    loop = asyncio.new_event_loop()
+    rows = produce()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(rows.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(rows.aclose())
+        loop.close()
+        dispatcher.stop()
+
+
+def run_remote(url, lines, parallelism, dry_run):
+    """Yield result rows streamed back from a running backend's /batch endpoint."""
+    import requests
+
+    with requests.post(url.rstrip("/") + "/batch", data="\n".join(lines).encode("utf-8"),
+                       params={"parallelism": parallelism, "dry_run": str(dry_run).lower()},
+                       headers={"Content-Type": "application/x-ndjson"}, stream=True,
+                       timeout=(5, None)) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if line:
+                yield json.loads(line)
+
+
+def batch(args):
+    with open(args.input, encoding="utf-8") as handle:
+        lines = handle.read().splitlines()
+    dry_run = not args.live
+    if args.url:
+        rows = run_remote(args.url, lines, args.parallelism, dry_run)
+    else:
+        rows = run_local(lines, args.parallelism, dry_run)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    routes = Counter()
+    started = time.perf_counter()
+    try:
+        for row in rows:
+            routes[row["route"]] += 1
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+    turns = sum(routes.values())
+    print(f"{turns} turns in {elapsed:.1f}s ({turns / elapsed if elapsed else 0:.1f}/s); "
+          f"routes: {dict(routes)}", file=sys.stderr)
+
+
 def main():
-    print("Hello from safespace-ai-agent!")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command")
+    batch_parser = commands.add_parser("batch", help="replay a JSONL file of messages or conversations")
+    batch_parser.add_argument("input", help="JSONL input file")
+    batch_parser.add_argument("-o", "--output", help="write results here instead of stdout")
+    batch_parser.add_argument("--parallelism", type=int, default=int(os.getenv("BATCH_PARALLELISM", "8")),
+                              help="conversations replayed at once")
+    batch_parser.add_argument("--url", help="send the batch to a running backend instead of running it here")
+    batch_parser.add_argument("--live", action="store_true",
+                              help="let tools book appointments; off by default (replays never place emergency calls)")
+    args = parser.parse_args()
+
+    if args.command == "batch":
+        batch(args)
+    else:
+        parser.print_help()
 
 
 if __name__ == "__main__":